@@ -1,10 +1,30 @@
 import streamlit as st
 
+from utils.profiling import end_page, start_page
+from utils.tokenizers import DEFAULT_ENCODINGS, TOKENIZER_CACHE_DIR, warm_up
+
 st.set_page_config(
     page_title="LLM Companion App",
     layout="centered"
 )
+
+start_page("Home")
+
+
+@st.cache_resource
+def warm_up_tokenizers():
+    # Load the tokenizers once per process, before the first page needs them
+    return warm_up()
+
+
+missing = [name for name in DEFAULT_ENCODINGS if name not in warm_up_tokenizers()]
+
 st.title("LLM Concept Explorer")
+if missing:
+    st.warning(
+        f"The tokenizer files for {', '.join(missing)} are not in {TOKENIZER_CACHE_DIR}, so the pages that "
+        f"tokenize text won't work. Run `python -m utils.tokenizers {' '.join(missing)}` where network is available."
+    )
 
 st.write("""Welcome to this LLM concept explorer.
 
@@ -12,3 +32,4 @@ On this site you can explore some of the concepts related to LLMs.
 
 The page is intended to be a learning tool for people that are new to LLMs and want to understand the concepts behind them.""")
 
+end_page()
@@ -0,0 +1,54 @@
+from pathlib import Path
+
+from streamlit.testing.v1 import AppTest
+
+from benchmarks.timing import measure
+
+ROOT = Path(__file__).resolve().parent.parent
+PAGES = ["app.py"] + sorted(str(p.relative_to(ROOT)) for p in (ROOT / "pages").glob("*.py"))
+
+TOKENIZATION_PAGE = "pages/02_Tokenization.py"
+TOKENIZATION_INPUT_CHARS = 100_000
+
+
+def _first_run(page):
+    at = AppTest.from_file(str(ROOT / page), default_timeout=120)
+    at.run()
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    return at
+
+
+def _tokenize(at, text):
+    at.text_area[0].input(text)
+    at.button[0].click().run()
+
+
+def _error(e):
+    return {"error": f"{type(e).__name__}: {e}"}
+
+
+def run(quick: bool = False):
+    results = {}
+    repeat = 3 if quick else 5
+    for page in PAGES:
+        # A failing page is reported on its own, the other pages still run
+        try:
+            at = _first_run(page)
+            results[f"{page}/first_run"] = measure(lambda: _first_run(page), repeat=repeat, warmup=0)
+            results[f"{page}/rerun"] = measure(lambda: at.run(), repeat=repeat)
+        except Exception as e:
+            results.setdefault(f"{page}/first_run", _error(e))
+
+    name = f"{TOKENIZATION_PAGE}/tokenize/chars={TOKENIZATION_INPUT_CHARS}"
+    try:
+        at = _first_run(TOKENIZATION_PAGE)
+        # e.g. the tokenizer files are missing: the page shows the error and
+        # stops before the text area
+        if at.error or not at.text_area:
+            raise RuntimeError(at.error[0].value if at.error else "the page has no text area")
+        text = ("The quick brown fox jumps over the lazy dog.\n" * TOKENIZATION_INPUT_CHARS)[:TOKENIZATION_INPUT_CHARS]
+        results[name] = measure(lambda: _tokenize(at, text), repeat=repeat)
+    except Exception as e:
+        results[name] = _error(e)
+    return results
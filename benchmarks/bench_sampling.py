@@ -0,0 +1,96 @@
+import numpy as np
+
+from benchmarks.timing import measure
+from utils.sampling import (
+    AliasSampler,
+    batch_sample,
+    batch_truncate,
+    build_alias_table,
+    build_pipeline,
+    ids_to_probability_distribution,
+    log_probabilities,
+    min_p_grid,
+    min_p_scaling,
+    sample_next_word,
+    samples_to_probability_distribution,
+    scale_probabilities,
+    temperature_grid,
+    top_k_grid,
+    top_k_indices,
+    top_k_scaling,
+    top_p_grid,
+    top_p_scaling
+)
+
+VOCAB_SIZES = [10, 1_000, 50_000, 200_000]
+BATCH_SIZES = [1, 8, 32]
+QUICK_VOCAB_SIZES = [10, 50_000]
+QUICK_BATCH_SIZES = [1, 8]
+
+
+def _logits(rng, batch, vocab):
+    return rng.standard_normal((batch, vocab)) * 3
+
+
+def _probs(logits):
+    probs = np.exp(logits - logits.max(axis=-1, keepdims=True))
+    return probs / probs.sum(axis=-1, keepdims=True)
+
+
+def run(quick: bool = False):
+    rng = np.random.default_rng(0)
+    results = {}
+    vocab_sizes = QUICK_VOCAB_SIZES if quick else VOCAB_SIZES
+    batch_sizes = QUICK_BATCH_SIZES if quick else BATCH_SIZES
+
+    for vocab in vocab_sizes:
+        probs = _probs(_logits(rng, 1, vocab))[0]
+        k = min(50, vocab)
+        words = [f"w{i}" for i in range(vocab)]
+
+        # 1D functions used by the Sampling page
+        results[f"scale_probabilities/v={vocab}"] = measure(lambda: scale_probabilities(probs, 0.7))
+        results[f"top_k_scaling/v={vocab}"] = measure(lambda: top_k_scaling(probs, k))
+        results[f"top_p_scaling/v={vocab}"] = measure(lambda: top_p_scaling(probs, 0.9))
+        results[f"min_p_scaling/v={vocab}"] = measure(lambda: min_p_scaling(probs, 0.05))
+
+        # Alias sampling, cold (table build) and warm (cached table)
+        results[f"build_alias_table/v={vocab}"] = measure(lambda: build_alias_table(probs))
+        sampler = AliasSampler(seed=0)
+        results[f"AliasSampler.draw/v={vocab}/n=1000000"] = measure(lambda: sampler.draw(probs, 1_000_000))
+        ids = sampler.draw(probs, 1_000_000)
+        results[f"ids_to_probability_distribution/v={vocab}/n=1000000"] = measure(
+            lambda: ids_to_probability_distribution(ids, vocab)
+        )
+        results[f"sample_next_word/v={vocab}/n=100000"] = measure(lambda: sample_next_word(probs, words, k=100_000))
+        sampled = sample_next_word(probs, words, k=100_000)
+        results[f"samples_to_probability_distribution/v={vocab}/n=100000"] = measure(
+            lambda: samples_to_probability_distribution(sampled, words)
+        )
+
+        # Slider grids
+        temperatures = np.round(np.arange(0.01, 2.0 + 1e-9, 0.01), 2)
+        ps = np.round(np.arange(0.01, 1.0 + 1e-9, 0.01), 2)
+        if vocab <= 50_000:
+            results[f"temperature_grid/v={vocab}"] = measure(lambda: temperature_grid(probs, temperatures))
+            results[f"top_k_grid/v={vocab}"] = measure(lambda: top_k_grid(probs, np.arange(1, 11)))
+            results[f"top_p_grid/v={vocab}"] = measure(lambda: top_p_grid(probs, ps))
+            results[f"min_p_grid/v={vocab}"] = measure(lambda: min_p_grid(probs, ps))
+
+        for batch in batch_sizes:
+            logits = _logits(rng, batch, vocab)
+            name = f"v={vocab}/b={batch}"
+            out = np.empty_like(logits)
+            pipeline = build_pipeline(temperature=0.7, top_k=k, top_p=0.9, min_p=0.02)
+
+            results[f"top_k_indices/{name}"] = measure(lambda: top_k_indices(logits, k))
+            results[f"batch_truncate/top_k/{name}"] = measure(lambda: batch_truncate(logits, top_k=k, from_logits=True))
+            results[f"batch_truncate/top_p/{name}"] = measure(lambda: batch_truncate(logits, top_p=0.9, from_logits=True))
+            results[f"batch_truncate/min_p/{name}"] = measure(lambda: batch_truncate(logits, min_p=0.05, from_logits=True))
+            indices, truncated = batch_truncate(logits, top_k=k, from_logits=True)
+            results[f"batch_sample/{name}"] = measure(lambda: batch_sample(indices, truncated))
+            results[f"LogitsPipeline/{name}"] = measure(lambda: pipeline(logits, out=out))
+            batch_probs = _probs(logits)
+            results[f"log_probabilities/{name}"] = measure(lambda: log_probabilities(batch_probs))
+
+    return results
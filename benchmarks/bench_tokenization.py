@@ -0,0 +1,45 @@
+from benchmarks.timing import measure
+from utils.generation import CORPUS_PATH
+from utils.tokenization import ChunkedTokenizer
+from utils.tokenizers import encoding_for_model
+
+INPUT_SIZES = [1_000, 100_000, 1_000_000, 5_000_000]
+QUICK_INPUT_SIZES = [1_000, 100_000]
+
+
+def _text(size: int) -> str:
+    with open(CORPUS_PATH, "r") as f:
+        corpus = f.read()
+    return (corpus * (size // len(corpus) + 1))[:size]
+
+
+def _with_throughput(result, n_tokens):
+    result["tokens_per_second"] = n_tokens / result["median"]
+    return result
+
+
+def run(quick: bool = False):
+    enc = encoding_for_model("gpt-4o")
+    results = {}
+    for size in QUICK_INPUT_SIZES if quick else INPUT_SIZES:
+        text = _text(size)
+        n_tokens = len(enc.encode(text, disallowed_special=()))
+        repeat = 3 if size >= 1_000_000 else 5
+
+        # What the Tokenization page used to do on every rerun
+        results[f"enc.encode/chars={size}"] = _with_throughput(
+            measure(lambda: enc.encode(text, disallowed_special=()), repeat=repeat), n_tokens
+        )
+        results[f"ChunkedTokenizer/cold/chars={size}"] = _with_throughput(
+            measure(lambda: ChunkedTokenizer(enc).encode(text), repeat=repeat), n_tokens
+        )
+        tokenizer = ChunkedTokenizer(enc)
+        tokenizer.encode(text)
+        results[f"ChunkedTokenizer/warm/chars={size}"] = _with_throughput(
+            measure(lambda: tokenizer.encode(text), repeat=repeat), n_tokens
+        )
+        edited = text + "\nOne more line at the end."
+        results[f"ChunkedTokenizer/edit_at_end/chars={size}"] = _with_throughput(
+            measure(lambda: tokenizer.encode(edited), repeat=repeat), n_tokens
+        )
+    return results
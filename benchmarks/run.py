@@ -0,0 +1,102 @@
+"""
+Runs the benchmark suites and optionally compares against a baseline.
+
+    python -m benchmarks.run                           # all suites, print results
+    python -m benchmarks.run --quick --suite sampling  # smaller sizes, one suite
+    python -m benchmarks.run --out results.json        # save results
+    python -m benchmarks.run --save-baseline           # store as the baseline
+    python -m benchmarks.run --compare                 # flag regressions vs. the baseline
+
+Run from the repository root. Exits with status 1 when a regression is found.
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+from pathlib import Path
+
+BASELINE_PATH = Path(__file__).resolve().parent / "baseline.json"
+
+# A benchmark regresses when its median is this much slower than the baseline
+DEFAULT_TOLERANCE = 0.25
+
+SUITES = ["sampling", "tokenization", "pages"]
+
+
+def run_suite(name: str, quick: bool):
+    if name == "sampling":
+        from benchmarks import bench_sampling as suite
+    elif name == "tokenization":
+        from benchmarks import bench_tokenization as suite
+    elif name == "pages":
+        from benchmarks import bench_pages as suite
+    else:
+        raise ValueError(f"Unknown suite: {name}")
+
+    try:
+        return suite.run(quick=quick)
+    except Exception as e:
+        # e.g. the tokenizer files are missing; keep the other suites' results
+        return {f"{name}/error": {"error": f"{type(e).__name__}: {e}"}}
+
+
+def compare(results, baseline, tolerance: float):
+    """Returns (name, baseline median, current median, ratio) for every regression."""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None or "median" not in previous or "median" not in current:
+            continue
+        ratio = current["median"] / previous["median"]
+        if ratio > 1 + tolerance:
+            regressions.append((name, previous["median"], current["median"], ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--suite", action="append", choices=SUITES, help="suite to run (repeatable, default: all)")
+    parser.add_argument("--quick", action="store_true", help="use smaller sizes")
+    parser.add_argument("--out", type=Path, help="write results to this JSON file")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH, help="baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="write results to the baseline file")
+    parser.add_argument("--compare", action="store_true", help="compare results against the baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="allowed slowdown, e.g. 0.25 for 25%%")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for name in args.suite or SUITES:
+        results.update(run_suite(name, args.quick))
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "quick": args.quick,
+        "results": results,
+    }
+
+    for name, result in results.items():
+        if "error" in result:
+            print(f"{name:70s} ERROR {result['error']}")
+        else:
+            print(f"{name:70s} {result['median'] * 1000:10.3f} ms")
+
+    for path in [args.out, args.baseline if args.save_baseline else None]:
+        if path is not None:
+            path.write_text(json.dumps(report, indent=2))
+
+    if args.compare:
+        baseline = json.loads(args.baseline.read_text())["results"]
+        regressions = compare(results, baseline, args.tolerance)
+        for name, before, after, ratio in regressions:
+            print(f"REGRESSION {name}: {before * 1000:.3f} ms -> {after * 1000:.3f} ms ({ratio:.2f}x)")
+        if regressions:
+            return 1
+        print("No regressions.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,18 @@
+import statistics
+import time
+
+
+def measure(fn, repeat: int = 5, number: int = 1, warmup: int = 1):
+    """
+    Times fn() and returns {"median": s, "min": s} per call, in seconds.
+    Each of the repeat samples averages over number calls.
+    """
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - start) / number)
+    return {"median": statistics.median(samples), "min": min(samples)}
@@ -1,5 +1,107 @@
+import os
+from concurrent.futures.process import BrokenProcessPool
+
 import streamlit as st
 
+from utils.profiling import end_page, section, start_page
+from utils.token_costs import HISTOGRAM_BINS, MODEL_PRICES, SUPPORTED_SUFFIXES, TokenCounter, iter_prompts
+from utils.tokenizers import TokenizerUnavailableError, get_encoding
+
+start_page("Prompt")
+
+# Inputs below this size are counted in the page's own process
+IN_PROCESS_BYTES = 1_000_000
+
+@st.cache_resource
+def get_counter(workers: int):
+    # One pool shared by all sessions; starting worker processes is slow
+    return TokenCounter(workers)
+
 st.title("Prompt")
-st.write("This section will handle prompt/context concepts.")
+st.markdown("""A prompt is the text a model is given to continue. Before the model sees it, the prompt is split into tokens, and both the model's context window and the price of a request are measured in tokens, not in words or characters.
+
+Type a prompt below to see how many tokens it takes and what sending it would cost with different models.""")
+
+prompt = st.text_area("Prompt", value="You are a helpful assistant. Explain in one paragraph what a token is.", height=120)
+rows = []
+unavailable = {}
+for model, (encoding, price) in MODEL_PRICES.items():
+    try:
+        n_tokens = len(get_encoding(encoding).encode_ordinary(prompt))
+    except TokenizerUnavailableError as e:
+        unavailable[encoding] = e
+        continue
+    rows.append({"Model": model, "Tokens": n_tokens, "Cost (USD)": f"{n_tokens * price / 1_000_000:.6f}"})
+for e in unavailable.values():
+    st.error(str(e))
+if rows:
+    st.table(rows)
+st.caption("Prices are example input prices per million tokens; check the provider's price list.")
+
+st.divider()
+st.subheader("Bulk Token Costs")
+st.markdown("""Estimate the cost of a whole dataset of prompts. Upload JSONL files (one JSON record per line, with a `prompt`, `text`, `input`, `content` or `messages` field), CSV files (a column with one of those names, or the first column) or plain text files (one prompt per file).""")
+
+source = st.radio("Upload", ["Files", "Folder"], horizontal=True)
+uploads = st.file_uploader(
+    "Prompt files",
+    type=[s.lstrip(".") for s in SUPPORTED_SUFFIXES],
+    accept_multiple_files=True if source == "Files" else "directory"
+)
+models = st.multiselect("Models", list(MODEL_PRICES), default=list(MODEL_PRICES))
+
+if uploads and models and st.button("Count tokens"):
+    encodings = sorted({MODEL_PRICES[m][0] for m in models})
+    total_bytes = sum(u.size for u in uploads)
+    progress = st.progress(0.0, text="Counting tokens...")
+
+    def prompts():
+        for upload in uploads:
+            upload.seek(0)
+            yield from iter_prompts(upload, upload.name)
+
+    counter = get_counter(0 if total_bytes < IN_PROCESS_BYTES else min(os.cpu_count() or 1, 4))
+    try:
+        with section("count_tokens"):
+            totals = counter.count(
+                prompts(),
+                encodings,
+                on_progress=lambda read: progress.progress(min(read / max(total_bytes, 1), 1.0), text="Counting tokens...")
+            )
+    except ValueError as e:
+        # Malformed JSON lines
+        st.error(f"Could not read the files: {e}")
+        st.stop()
+    except BrokenProcessPool:
+        # A worker died; the next count starts a new pool
+        get_counter.clear()
+        st.error("Counting failed because a worker process stopped unexpectedly. Please try again.")
+        st.stop()
+    except RuntimeError as e:
+        # Tokenizers that can't be loaded in the workers
+        st.error(f"Could not count the tokens: {e}")
+        st.stop()
+    progress.empty()
+
+    col_prompts, col_characters = st.columns(2)
+    col_prompts.metric("Prompts", f"{totals.prompts:,}")
+    col_characters.metric("Characters", f"{totals.characters:,}")
+    st.table([
+        {
+            "Model": model,
+            "Tokens": f"{totals.tokens.get(MODEL_PRICES[model][0], 0):,}",
+            "Longest prompt": f"{totals.max_tokens.get(MODEL_PRICES[model][0], 0):,}",
+            "Cost (USD)": f"{totals.cost(model):,.4f}"
+        }
+        for model in models
+    ])
+
+    histogram = totals.histogram.get(encodings[0])
+    if histogram is not None:
+        # Bin i holds prompts with 2**(i-1) to 2**i - 1 tokens
+        used = max(int(histogram.nonzero()[0].max(initial=0)) + 1, 1)
+        labels = ["0"] + [f"{2 ** (i - 1)}-{2 ** i - 1}" for i in range(1, HISTOGRAM_BINS)]
+        st.markdown(f"**Prompt lengths** ({encodings[0]} tokens)")
+        st.bar_chart({"Tokens": labels[:used], "Prompts": histogram[:used].tolist()}, x="Tokens", y="Prompts", sort=False)
 
+end_page()
@@ -1,8 +1,54 @@
+import math
+import os
+import re
+
+import numpy as np
 import streamlit as st
-import tiktoken
-import html
 
-enc = tiktoken.encoding_for_model("gpt-4o")
+from utils.corpus_stats import CORPUS_DIR, CORPUS_STATS_DIR, CorpusStats, analyze, list_snapshots, snapshot_path
+from utils.profiling import end_page, section, start_page
+from utils.token_render import (
+    TOKEN_CSS,
+    DecodeTable,
+    page_bounds,
+    render_token_ids_markdown,
+    render_tokens_html
+)
+from utils.tokenization import COMPARISON_ENCODINGS, ChunkedTokenizer, common_boundaries, compare_encodings
+from utils.tokenizers import TokenizerUnavailableError, load_seconds, require_encoding, require_encoding_for_model
+
+start_page("Tokenization")
+
+enc = require_encoding_for_model("gpt-4o")
+
+PAGE_SIZE = 500
+# Corpora below this size are analyzed in the page's own process
+IN_PROCESS_BYTES = 1_000_000
+
+
+@st.cache_resource
+def get_tokenizer():
+    return ChunkedTokenizer(enc)
+
+
+@st.cache_resource
+def get_decode_table(encoding_name: str):
+    return DecodeTable(enc)
+
+
+@st.cache_data
+def load_snapshot(name: str, modified: float):
+    # modified is only part of the cache key, so a re-analyzed corpus is reloaded
+    return CorpusStats.load(snapshot_path(name))
+
+
+def corpus_folders():
+    """Folders under the corpus directory that can be analyzed, relative to it."""
+    return ["."] + sorted(
+        str(p.relative_to(CORPUS_DIR)) for p in CORPUS_DIR.rglob("*")
+        if p.is_dir() and CORPUS_STATS_DIR not in (p, *p.parents)
+    )
+
 
 st.title("Tokenization")
 st.markdown("""Tokenization divides text into smaller units `tokens`that a model can interpret. A token can be a full word, a fragment, or a piece of punctuation. Instead of reading text in a human sense, the model processes numerical representations, and tokenization defines how each fragment becomes a number.
@@ -14,67 +60,165 @@ st.markdown("""Type some text in the text field below to see how it gets tokeniz
 left, right = st.columns([1.1, 1])
 
 with left:
-    text_input = st.text_area(
-        "Text to tokenize",
-        height=300,
-        placeholder="Type or paste text to tokenize...",
-        label_visibility="collapsed"
-    )
-
+    # A form only reruns the page when the text is submitted
+    with st.form("tokenize_form", border=False):
+        text_input = st.text_area(
+            "Text to tokenize",
+            height=300,
+            placeholder="Type or paste text to tokenize...",
+            label_visibility="collapsed"
+        )
+        compare = st.checkbox(
+            "Compare tokenizers",
+            help="Also encode the text with the tokenizers of older OpenAI models"
+        )
+        st.form_submit_button("Tokenize")
 
-    if st.button("Tokenize") or text_input:
-        tokens = enc.encode(text_input)
+    if text_input:
+        with section("encode"):
+            result = get_tokenizer().encode(text_input)
+        tokens = result.tokens
         st.metric("Token count", len(tokens))
+        st.caption(
+            f"{result.tokens_per_second:,.0f} tokens/sec · "
+            f"{result.cached_chunks}/{result.chunks} chunks cached · "
+            f"tokenizer loaded in {load_seconds(enc.name) * 1000:.0f} ms"
+        )
 
 with right:
     if text_input:
+        # Only one page of tokens is rendered, so the payload sent to the
+        # browser stays the same size however long the input is.
+        n_pages = max(1, math.ceil(len(tokens) / PAGE_SIZE))
+        page = 1
+        if n_pages > 1:
+            page = st.number_input(
+                f"Page (of {n_pages})",
+                min_value=1,
+                max_value=n_pages,
+                value=1
+            )
+        start, stop = page_bounds(len(tokens), page, PAGE_SIZE)
+        window = tokens[start:stop]
+        table = get_decode_table(enc.name)
+
+        with section("render"):
+            st.markdown(TOKEN_CSS, unsafe_allow_html=True)
+            st.markdown(render_tokens_html(window, table), unsafe_allow_html=True)
+            st.markdown(render_token_ids_markdown(window, table), unsafe_allow_html=True)
+
+if text_input and compare:
+    st.subheader("Tokenizer Comparison")
+    st.markdown("""Different models use different tokenizers. Newer tokenizers have larger vocabularies, so they usually need fewer tokens for the same text (more characters per token).""")
+
+    try:
+        with section("compare"):
+            comparisons = compare_encodings(text_input, COMPARISON_ENCODINGS)
+    except TokenizerUnavailableError as e:
+        st.error(str(e))
+        st.stop()
+    st.table({
+        "Encoding": [c.name for c in comparisons],
+        "Tokens": [f"{len(c.tokens):,}" for c in comparisons],
+        "Chars/token": [f"{c.chars_per_token:.2f}" for c in comparisons],
+        "Encode ms": [f"{c.seconds * 1000:.1f}" for c in comparisons],
+        f"Boundaries shared with {comparisons[0].name}": [f"{c.shared_boundaries:.0%}" for c in comparisons]
+    })
+    st.caption(f"{len(common_boundaries(comparisons)):,} token boundaries are the same in all {len(comparisons)} encodings.")
+
+st.divider()
+st.subheader("Corpus Analytics")
+st.markdown("""A tokenizer's vocabulary is built from a training corpus, so how well it fits a text depends on how similar the text is to that corpus. Analyze a whole folder of text files to see which tokens it uses most, how long they are, how many characters each token covers per file or language (subfolder), and which tokens barely occur at all.""")
 
-        def token_color(t):
-            colors = [
-                "#ff6666", "#ff9966", "#ffcc66",
-                "#99cc66", "#66cccc", "#6699ff",
-                "#cc66ff"
-            ]
-            return colors[t % len(colors)]
-
-        def format_token_text(t: int) -> str:
-            s = enc.decode([t])
-            s = s.replace("\n", "\\n")
-            s = s.replace("\r", "\\r")
-            s = s.replace("`", "\\`")
-            return s
-
-        colored_tokens = []
-        for t in tokens:
-            piece = format_token_text(t)
-            piece = html.escape(piece).replace(" ", "&nbsp;")
-            colored_tokens.append(
-                f"<span title='{t}' style='background:{token_color(t)}22; "
-                f"padding:2px 4px; border-radius:4px; "
-                f"display:inline-block; margin:2px;'>"
-                f"{piece}"
-                "</span>"
+col_folder, col_name = st.columns(2)
+with col_folder:
+    folder = st.selectbox("Folder", corpus_folders(), help=f"Folders under {CORPUS_DIR}")
+with col_name:
+    snapshot_name = st.text_input(
+        "Snapshot name",
+        value="corpus" if folder == "." else re.sub(r"[^\w-]+", "_", folder),
+        help="Letters, digits, _ and -"
+    )
+
+if st.button("Analyze") and snapshot_name:
+    try:
+        path = snapshot_path(snapshot_name)
+    except ValueError as e:
+        st.error(str(e))
+    else:
+        folder_path = CORPUS_DIR / folder
+        total_bytes = sum(p.stat().st_size for p in folder_path.rglob("*") if p.is_file())
+        progress = st.progress(0.0, text="Analyzing corpus...")
+        with section("analyze_corpus"):
+            stats = analyze(
+                [folder_path],
+                enc.name,
+                workers=0 if total_bytes < IN_PROCESS_BYTES else min(os.cpu_count() or 1, 4),
+                on_progress=lambda done, total: progress.progress(done / max(total, 1), text="Analyzing corpus...")
             )
+        progress.empty()
+        CORPUS_STATS_DIR.mkdir(parents=True, exist_ok=True)
+        stats.save(path)
+        st.session_state.corpus_snapshot = snapshot_name
 
-        st.markdown(
-            f"""
-            <div style="
-                border:1px solid #ddd; 
-                padding:10px; 
-                border-radius:6px;
-                height:300px; 
-                overflow-y:scroll;
-                background:#fafafa;
-                white-space: pre-wrap;
-                ">
-                {''.join(colored_tokens)}
-            </div>
-            """,
-            unsafe_allow_html=True
-        )
+snapshots = list_snapshots()
+if snapshots:
+    selected = st.session_state.get("corpus_snapshot")
+    name = st.selectbox("Snapshot", snapshots, index=snapshots.index(selected) if selected in snapshots else 0)
+    with section("load_snapshot"):
+        stats = load_snapshot(name, snapshot_path(name).stat().st_mtime)
+    corpus_enc = require_encoding(stats.encoding)
+    decode = lambda ids: [repr(corpus_enc.decode([t])) for t in ids.tolist()]
+
+    col_files, col_tokens, col_distinct, col_ratio = st.columns(4)
+    col_files.metric("Files", f"{len(stats.files):,}")
+    col_tokens.metric("Tokens", f"{stats.total_tokens:,}")
+    col_distinct.metric("Distinct tokens", f"{np.count_nonzero(stats.token_counts):,}")
+    col_ratio.metric("Chars/token", f"{stats.chars_per_token:.2f}")
+
+    col_top, col_lengths = st.columns(2)
+    with col_top:
+        st.markdown("**Most frequent tokens**")
+        ids, counts = stats.top_tokens(20)
+        st.dataframe({
+            "Token": decode(ids),
+            "ID": ids.tolist(),
+            "Count": counts.tolist(),
+            "Share": [f"{c / max(stats.total_tokens, 1):.2%}" for c in counts.tolist()]
+        }, hide_index=True)
+    with col_lengths:
+        st.markdown("**Token lengths** (bytes)")
+        histogram = stats.length_histogram(corpus_enc)
+        st.bar_chart({"Bytes": list(range(len(histogram))), "Tokens": histogram.tolist()}, x="Bytes", y="Tokens")
+
+    st.markdown("**Characters per token**")
+    groups = stats.by_group()
+    if len(groups) > 1:
+        st.dataframe({
+            "Group": list(groups),
+            "Tokens": [t for _, t in groups.values()],
+            "Chars/token": [round(c / max(t, 1), 2) for c, t in groups.values()]
+        }, hide_index=True)
+    st.dataframe({
+        "File": [os.path.relpath(f, CORPUS_DIR) for f in stats.files.tolist()],
+        "Bytes": stats.file_bytes.tolist(),
+        "Tokens": stats.file_tokens.tolist(),
+        "Chars/token": np.round(stats.file_chars / np.maximum(stats.file_tokens, 1), 2).tolist()
+    }, hide_index=True)
+
+    st.markdown("**Rare tokens**")
+    max_count = st.slider("Seen at most", min_value=1, max_value=10, value=1)
+    rare = stats.rare_tokens(max_count)
+    unused = corpus_enc.n_vocab - np.count_nonzero(stats.token_counts)
+    st.caption(
+        f"{len(rare):,} tokens occur at most {max_count} time(s); "
+        f"{unused:,} of the {corpus_enc.n_vocab:,} tokens in the vocabulary never occur."
+    )
+    if len(rare):
+        # The rarest first, 50 at most
+        shown = rare[np.argsort(stats.token_counts[rare], kind="stable")][:50]
+        st.dataframe({"Token": decode(shown), "ID": shown.tolist(), "Count": stats.token_counts[shown].tolist()}, hide_index=True)
+else:
+    st.caption("No corpus has been analyzed yet.")
 
-        token_pairs = [
-            f"`{format_token_text(t)}` → **{t}**"
-            for t in tokens
-        ]
-        st.markdown("<br>".join(token_pairs), unsafe_allow_html=True)
+end_page()
@@ -1 +1,75 @@
-# Implement this.
\ No newline at end of file
+import streamlit as st
+
+from utils.embeddings import EmbeddingStore
+from utils.profiling import end_page, section, start_page
+from utils.projection import ProjectionTiles
+from utils.similarity import ExactIndex
+
+start_page("Embedding")
+
+@st.cache_resource
+def load_index():
+    # Shared by all sessions, like the embedding store it searches
+    return ExactIndex(EmbeddingStore())
+
+@st.cache_resource
+def load_projection():
+    # Precomputed with `python -m utils.projection`
+    return ProjectionTiles()
+
+@st.cache_data
+def load_tokens():
+    with open("assets/tokens.txt", "r") as f:
+        return f.read().splitlines()
+
+token_ids = [976, 4853, 19705, 68347, 65613, 1072, 290, 29082, 6446, 13]
+tokens = load_tokens()
+token_of = dict(zip(token_ids, tokens))
+index = load_index()
+
+st.title("Embedding Similarity")
+st.markdown("""Tokens that are used in similar ways end up with embeddings that point in similar directions. A common way to compare two embeddings is **cosine similarity**: 1 means the vectors point the same way, 0 means they are unrelated and -1 means they point in opposite directions.
+
+Pick a token from our example sentence to see which of the other tokens are closest to it.""")
+
+selected = st.selectbox("Token", tokens)
+selected_id = token_ids[tokens.index(selected)]
+
+with section("search"):
+    neighbour_ids, scores = index.search(index.store.get([selected_id]), k=len(token_ids) - 1, exclude=[selected_id])
+st.table({
+    "Token": [token_of[t] for t in neighbour_ids[0].tolist()],
+    "Cosine similarity": [f"{s:.3f}" for s in scores[0].tolist()]
+})
+
+st.subheader("Embedding Space")
+st.markdown("""Embeddings have far too many dimensions to draw, so below they are projected down to two dimensions with PCA (principal component analysis). The projection keeps as much of the spread between the embeddings as possible, but distances in the plot are only an approximation of the real ones.
+
+Use the sliders to zoom in on a part of the plot.""")
+
+projection = load_projection()
+xmin, xmax, ymin, ymax = projection.bounds
+x_range = st.slider("X range", min_value=xmin, max_value=xmax, value=(xmin, xmax))
+y_range = st.slider("Y range", min_value=ymin, max_value=ymax, value=(ymin, ymax))
+
+coords, point_ids = projection.query(*x_range, *y_range)
+points = [
+    {"x": x, "y": y, "token": token_of.get(t, str(t))}
+    for (x, y), t in zip(coords.tolist(), point_ids.tolist())
+]
+st.vega_lite_chart(
+    {
+        "data": {"values": points},
+        "layer": [
+            {"mark": {"type": "point", "filled": True}},
+            {"mark": {"type": "text", "dy": -10}, "encoding": {"text": {"field": "token"}}}
+        ],
+        "encoding": {
+            "x": {"field": "x", "type": "quantitative", "scale": {"domain": list(x_range)}, "title": None},
+            "y": {"field": "y", "type": "quantitative", "scale": {"domain": list(y_range)}, "title": None}
+        }
+    },
+    width="stretch"
+)
+
+end_page()
@@ -0,0 +1,107 @@
+import streamlit as st
+
+from utils.decoding import beam_search, greedy_search
+from utils.generation import CORPUS_PATH, GenerationEngine, NGramModel
+from utils.plot import plot_distribution
+from utils.profiling import end_page, section, start_page
+from utils.tokenizers import require_encoding_for_model
+
+start_page("Generation")
+
+enc = require_encoding_for_model("gpt-4o")
+
+@st.cache_resource
+def load_engine():
+    # Shared by all sessions, so cached distributions are reused across users
+    with open(CORPUS_PATH, "r") as f:
+        model = NGramModel.from_text(f.read(), enc)
+    return GenerationEngine(model)
+
+engine = load_engine()
+
+st.title("Text Generation")
+st.markdown("""A language model writes text one token at a time. At every step it looks at everything written so far, produces a probability distribution over its vocabulary, and one token is sampled from that distribution. The chosen token is appended to the text and the process repeats.
+
+The model used on this page is a tiny stand-in: it has only counted which tokens follow each other in a few paragraphs of text. Real models are far better at predicting the next token, but they generate text in exactly the same way.""")
+
+prompt = st.text_input("Prompt", value="I have a")
+
+col_temperature, col_top_k, col_top_p, col_length = st.columns(4)
+with col_temperature:
+    temperature = st.slider("Temperature", min_value=0.01, max_value=2.0, value=0.7, step=0.01)
+with col_top_k:
+    top_k = st.slider("Top-k", min_value=1, max_value=50, value=50)
+with col_top_p:
+    top_p = st.slider("Top-p", min_value=0.01, max_value=1.0, value=0.9, step=0.01)
+with col_length:
+    max_tokens = st.slider("Tokens", min_value=1, max_value=100, value=30)
+
+if "generation" not in st.session_state:
+    st.session_state.generation = {"prompt_ids": [], "steps": []}
+generation = st.session_state.generation
+
+def run(prompt_ids, steps):
+    """Generates tokens after prompt_ids + steps, showing the text as it grows."""
+    generation["prompt_ids"] = prompt_ids
+    generation["steps"] = steps
+    placeholder = st.empty()
+    context = prompt_ids + [s.token for s in steps]
+    with section("generate"):
+        for step in engine.generate(
+            context,
+            max_new_tokens=max_tokens - len(steps),
+            temperature=temperature,
+            top_k=top_k,
+            top_p=top_p
+        ):
+            steps.append(step)
+            placeholder.markdown(f"**{enc.decode(prompt_ids)}**{enc.decode([s.token for s in steps])}")
+    placeholder.empty()
+
+if st.button("Generate"):
+    run(enc.encode(prompt, disallowed_special=()), [])
+
+steps = generation["steps"]
+if steps:
+    st.markdown(f"**{enc.decode(generation['prompt_ids'])}**{enc.decode([s.token for s in steps])}")
+    st.metric("Tokens/sec", f"{steps[-1].tokens_per_second:,.0f}")
+
+    st.divider()
+    st.subheader("Step by Step")
+    st.markdown("""Pick a step to see the distribution the token was sampled from. You can also rewind to that step and let the model sample a different continuation from there.""")
+
+    if len(steps) > 1:
+        selected = st.slider("Step", min_value=1, max_value=len(steps), value=1)
+    else:
+        selected = 1
+    step = steps[selected - 1]
+    st.markdown(f"Chosen token: `{enc.decode([step.token])}` (probability {step.probability:.3f})")
+    plot_distribution(
+        step.top_probabilities,
+        [enc.decode([t]) for t in step.top_tokens.tolist()],
+        title=f"Top {len(step.top_tokens)} tokens at step {selected}"
+    )
+
+    if st.button("Rewind and sample again from this step"):
+        run(generation["prompt_ids"], steps[:selected - 1])
+        st.rerun()
+
+st.divider()
+st.subheader("Greedy and Beam Search")
+st.markdown("""Sampling is not the only way to pick the next token. **Greedy search** always picks the single most probable token. **Beam search** keeps several candidate continuations (beams) at every step and in the end returns the ones with the highest overall probability, adjusted for their length.
+
+Both are deterministic: the same prompt always gives the same text.""")
+
+num_beams = st.slider("Beams", min_value=1, max_value=16, value=4)
+if st.button("Search"):
+    prompt_ids = enc.encode(prompt, disallowed_special=())
+    with section("search"):
+        greedy = greedy_search(engine.model, prompt_ids, max_new_tokens=max_tokens)
+        hypotheses = beam_search(engine.model, prompt_ids, num_beams=num_beams, max_new_tokens=max_tokens)
+    st.table({
+        "Method": ["Greedy"] + [f"Beam {i + 1}" for i in range(len(hypotheses))],
+        "Text": [enc.decode(h.tokens) for h in [greedy] + hypotheses],
+        "Score": [f"{h.score:.3f}" for h in [greedy] + hypotheses]
+    })
+
+end_page()
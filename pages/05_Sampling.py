@@ -1,18 +1,26 @@
 import streamlit as st
 import numpy as np
 
+from utils.logprobs import LogprobError, LogprobRequest, get_provider
 from utils.plot import (
     plot_bar_chart_probability_distribution,
     plot_distribution
 )
+from utils.profiling import end_page, section, start_page
 from utils.sampling import (
-    scale_probabilities,
+    build_pipeline,
+    grid_index,
+    log_probabilities,
     sample_next_word,
     samples_to_probability_distribution,
-    min_p_scaling,
-    top_k_scaling,
-    top_p_scaling
+    min_p_grid,
+    temperature_grid,
+    top_k_grid,
+    top_p_grid
 )
+from utils.token_render import escape_token_text
+
+start_page("Sampling")
 
 text_prefix = "I have a"
 #vocabulary = ["cat", "dog", "house", "car", "dream", "pen", "book", "friend", "idea", "problem"]
@@ -22,6 +30,27 @@ vocabulary = ["dog", "cat", "dream", "book", "question", "plan", "car", "pen", "
 probabilities = np.array([0.45853809710312615, 0.40465845041054327, 0.07031908764647739, 0.015690313995143465, 0.015690313995143465, 0.012219628826053952, 0.010783784589726049, 0.0050938991521505715, 0.002406187582511743, 0.0006893842845350389])
 probabilities = probabilities / np.sum(probabilities)
 
+@st.cache_resource
+def get_logprob_provider():
+    # One per process, so its disk cache and connections are shared by all sessions
+    return get_provider()
+
+# Values each slider can take
+TEMPERATURES = np.round(np.arange(0.01, 2.0 + 1e-9, 0.01), 2)
+TOP_KS = np.arange(1, len(vocabulary) + 1)
+TOP_PS = np.round(np.arange(0.01, 1.0 + 1e-9, 0.01), 2)
+MIN_PS = np.round(np.arange(0.0, 1.0 + 1e-9, 0.01), 2)
+
+@st.cache_data
+def sampling_grids(probabilities):
+    # Every slider position of every method, computed once per distribution
+    return {
+        "temperature": temperature_grid(probabilities, TEMPERATURES),
+        "top_k": top_k_grid(probabilities, TOP_KS),
+        "top_p": top_p_grid(probabilities, TOP_PS),
+        "min_p": min_p_grid(probabilities, MIN_PS),
+    }
+
 st.title("Understanding Sampling in LLMs")
 st.markdown("""Large Language Models (LLMs) produce text by predicting the next token (word, sub-word, or character) given a context. Under the hood, they produce a probability distribution over a vocabulary of possible next tokens. But how do we go from probabilities to an actual token choice? That’s where **sampling** comes in.""")
 
@@ -32,8 +61,20 @@ st.markdown("""OpenAI's Chat Completions API provides a parameter, `top_logprobs
 - We'll treat these ten tokens as our vocabulary to explore and illustrate different sampling methods in a simplified context.
 - Note that in practice the whole model vocabulary is used, which is much larger than our ten samples. Typically in the range of 60.000-100.000+ tokens.""")
 
-st.markdown("""**Example prompt:** **`I have a`**""")
-st.markdown("""**Possible next words:** **`dog`, `cat`, `dream`, `book`, `question`, `plan`, `car`, `pen`, `pet`, `idea`**""")
+prompt = st.text_input("Example prompt", value=text_prefix, help="Change the prompt to fetch its ten most likely next tokens")
+if prompt != text_prefix:
+    try:
+        with section("fetch_logprobs"):
+            top = get_logprob_provider().fetch([LogprobRequest(prompt, top_logprobs=len(vocabulary))])[0]
+    except LogprobError as e:
+        st.error(f"Could not get the next-token probabilities for this prompt, showing the ones for \"{text_prefix}\" instead. ({e})")
+    else:
+        vocabulary = [escape_token_text(t) for t in top.tokens]
+        probabilities = top.probabilities
+
+grids = sampling_grids(probabilities)
+
+st.markdown(f"""**Possible next words:** **{", ".join(f"`{v}`" for v in vocabulary)}**""")
 st.markdown("""In the plot below, we can see the initial probability distribution over the vocabulary for the next token, given our prompt.""")
 plot_distribution(
     probabilities,
@@ -68,7 +109,7 @@ unsafe_allow_html=True
 )
 
 temperature = st.slider("Temperature", min_value=0.01, max_value=2.0, value=1.0, step=0.01)
-modified_probabilities = scale_probabilities(probabilities, temperature)
+modified_probabilities = grids["temperature"][grid_index(TEMPERATURES, temperature)]
 
 plot_bar_chart_probability_distribution(
     probabilities,
@@ -84,7 +125,7 @@ st.markdown(r"""**Top-k sampling** chooses from only the **k most probable token
 For instance, if \( k = 3 \), we only consider the top 3 tokens by probability and ignore the rest.""")
 
 top_k_val = st.slider("Top-k", min_value=1, max_value=10, value=10)
-modified_probabilities = top_k_scaling(probabilities, top_k_val)
+modified_probabilities = grids["top_k"][grid_index(TOP_KS, top_k_val)]
 
 plot_bar_chart_probability_distribution(
     probabilities,
@@ -103,7 +144,7 @@ st.markdown(r"""**Top-p (or nucleus) sampling** chooses from the **smallest set
 This method adapts dynamically to how peaked the distribution is. For a very peaked distribution, the top tokens might already exceed \(p\). For a flatter distribution, we might need more tokens.""")
 
 top_p_val = st.slider("Top-p", min_value=0.01, max_value=1.0, value=1.0, step=0.01)
-modified_probabilities = top_p_scaling(probabilities, top_p_val)
+modified_probabilities = grids["top_p"][grid_index(TOP_PS, top_p_val)]
 
 plot_bar_chart_probability_distribution(
     probabilities,
@@ -130,7 +171,7 @@ unsafe_allow_html=True
 
 min_p_val = st.slider("Min-p", min_value=.0, max_value=1.0, value=.0, step=0.01)
 
-modified_probabilities = min_p_scaling(probabilities, min_p_val)
+modified_probabilities = grids["min_p"][grid_index(MIN_PS, min_p_val)]
 
 plot_bar_chart_probability_distribution(
     probabilities,
@@ -139,6 +180,35 @@ plot_bar_chart_probability_distribution(
     title = "Initial vs. Min-p Sampling"
 )
 
+st.divider()
+st.subheader("Combining Methods")
+st.markdown("""In practice these methods are often combined, for example a temperature of 0.7 together with top-p 0.9. They are applied one after another: temperature first, then top-k, top-p and min-p, and the result is re-normalized once at the end.""")
+
+col_temperature, col_top_k, col_top_p, col_min_p = st.columns(4)
+with col_temperature:
+    combined_temperature = st.slider("Temperature", min_value=0.01, max_value=2.0, value=0.7, step=0.01, key="combined_temperature")
+with col_top_k:
+    combined_top_k = st.slider("Top-k", min_value=1, max_value=10, value=10, key="combined_top_k")
+with col_top_p:
+    combined_top_p = st.slider("Top-p", min_value=0.01, max_value=1.0, value=0.9, step=0.01, key="combined_top_p")
+with col_min_p:
+    combined_min_p = st.slider("Min-p", min_value=.0, max_value=1.0, value=.0, step=0.01, key="combined_min_p")
+
+pipeline = build_pipeline(
+    temperature=combined_temperature,
+    top_k=combined_top_k,
+    top_p=combined_top_p,
+    min_p=combined_min_p
+)
+modified_probabilities = pipeline(log_probabilities(probabilities))
+
+plot_bar_chart_probability_distribution(
+    probabilities,
+    modified_probabilities,
+    vocabulary,
+    title = "Initial vs. Combined Sampling"
+)
+
 st.divider()
 st.subheader("Summary")
 st.markdown("""In text generation, models usually choose the next token according to its probability. Adjusting how that choice is made can shift the output toward tighter structure or more open-ended variation. Several sampling strategies exist, each shaping the balance between stability and inventiveness in different ways.""")
@@ -148,3 +218,5 @@ st.markdown(r"""| Method | Summary | Strength | Weakness |
 | **Top-k** | Keep a fixed number of most probable tokens, discard the rest. | Prevents sampling from long-tail, low-probability tokens, ensuring coherent and focused output. | Keeps a fixed number of tokens, even if some in the top $k$ have extremely low probabilities, which can lead to suboptimal choices in contexts with skewed distributions. |
 | **Top-p** | Dynamically adapt the sampling pool to include only the most probable tokens. | Adapts the token pool to context, ensuring more flexibility and diversity while maintaining coherence. | Can lead to overly small or overly large sampling pools depending on the distribution, making it less predictable than fixed-size methods like top-k. |
 | **Min-p** | Dynamically adapt the sampling pool to include only relatively probable tokens wrt the most probable one. | Balances coherence and creativity by making token thresholds context-sensitive, avoiding arbitrary truncation and enabling diverse generation in uncertain contexts. | Requires careful tuning of the $p_{\text{base}}$ parameter, and its reliance on relative probabilities may sometimes overlook rare but contextually valid tokens. |""")
+
+end_page()
@@ -1,29 +1,44 @@
+import html
+
 import numpy as np
 import streamlit as st
 
-def load_embeddings():
-    embeddings = np.load("assets/token_embeddings.npy")
+from utils.embeddings import EmbeddingStore
+from utils.profiling import end_page, section, start_page
+from utils.tokenizers import TokenizerUnavailableError, encoding_for_model
+
+start_page("Explore")
+
+EXAMPLE_SENTENCE = "The quick brown fox jumps over the lazy dog."
+# gpt-4o token ids of the example sentence, so it can be shown without the tokenizer
+EXAMPLE_TOKEN_IDS = [976, 4853, 19705, 68347, 65613, 1072, 290, 29082, 6446, 13]
+
+@st.cache_resource
+def load_embedding_store():
+    # Shared by all sessions; rows are read from the memory-mapped file on demand
+    return EmbeddingStore()
+
+@st.cache_data
+def load_tokens():
     with open("assets/tokens.txt", "r") as f:
-        tokens = f.read().splitlines()
-    return embeddings, tokens
-
-embeddings, tokens = load_embeddings()
-token_ids = [
-    976,
-    4853,
-    19705,
-    68347,
-    65613,
-    1072,
-    290,
-    29082,
-    6446,
-    13
-]
-
-embeddings_as_str = []
-for e in embeddings:
-    embeddings_as_str.append('<br>'.join([f'{v:.3f}' for v in e.tolist()]))
+        return f.read().splitlines()
+
+@st.cache_data(max_entries=256)
+def tokenize(sentence: str):
+    """
+    Returns the (escaped) token texts and token ids of sentence. Only
+    sentences other than the example need the tokenizer, which raises
+    TokenizerUnavailableError if its file is missing.
+    """
+    if sentence == EXAMPLE_SENTENCE:
+        return [html.escape(t) for t in load_tokens()], EXAMPLE_TOKEN_IDS
+    enc = encoding_for_model("gpt-4o")
+    token_ids = enc.encode(sentence, disallowed_special=())
+    pieces = [
+        html.escape(enc.decode_single_token_bytes(t).decode("utf-8", errors="replace"))
+        for t in token_ids
+    ]
+    return pieces, token_ids
 
 pill_css = """
 <style>
@@ -98,65 +113,75 @@ if "step" not in st.session_state:
 
 max_step = 3
 
-def build_html(step: int) -> str:
-    """Build the HTML up to the given step."""
-    n = len(tokens)
-    html = f'<div class="pill-layout" style="grid-template-columns: repeat({n}, 1fr);">'
-
-    # Step 0: input text only
-    html += '<div class="input-text">The quick brown fox jumps over the lazy dog.</div>'
-
-    # Step 1: tokens
-    if step >= 1:
-        html += '<div class="arrow-row">&#x2193;</div>'
-        for t in tokens:
-            html += f'<div class="pill-cell"><div class="pill">{t}</div></div>'
-
-    # Step 2: token ids
-    if step >= 2:
-        html += '<div class="arrow-row">&#x2193;</div>'
-        for tid in token_ids:
-            html += f'<div class="pill-cell"><div class="pill">{tid}</div></div>'
-
-    # Step 3: embeddings
-    if step >= 3:
-        html += '<div class="arrow-row">&#x2193;</div>'
-        for e in embeddings_as_str:
-            html += f'<div class="pill-cell"><div class="embeddings">{e}</div></div>'
-
-    html += "</div>"
-    return html
-
-
-left, middle, right = st.columns([1, 1, 1])
-
-with middle:
-    step_label = ["Tokenize", "Lookup IDs", "Lookup Embeddings", "Reset"]
-
-    with st.container():
-        # Inject CSS scoped to this column block
-        st.markdown("""
-        <style>
-        /* Target the first stButton inside this block only */
-        div[data-testid="stVerticalBlock"] div.stButton > button {
-            width: 170px;
-            height: 40px;
-        }
-        </style>
-        """, unsafe_allow_html=True)
-
-        clicked = st.button(step_label[st.session_state.step])
-        st.markdown('</div>', unsafe_allow_html=True)
-
-        if clicked:
-            if st.session_state.step == 3:
-                st.session_state.step = 0
-                st.rerun()
-            elif st.session_state.step < max_step:
-                st.session_state.step += 1
-                st.rerun()
-
-placeholder = st.empty()
-
-html = build_html(st.session_state.step)
-placeholder.markdown(html, unsafe_allow_html=True)
+def _pills(values, css_class: str) -> str:
+    return "".join([f'<div class="pill-cell"><div class="{css_class}">{v}</div></div>' for v in values])
+
+def _embedding_pills(token_ids) -> str:
+    store = load_embedding_store()
+    known = [t for t in token_ids if t in store]
+    formatted = dict(zip(known, np.char.mod("%.3f", store.get(known)))) if known else {}
+    # The demo store only has embeddings for the tokens of the example sentence
+    return _pills(["<br>".join(formatted[t]) if t in formatted else "not in<br>demo store" for t in token_ids], "embeddings")
+
+@st.cache_data(max_entries=1024)
+def build_layer(sentence: str, step: int) -> str:
+    """
+    HTML of one step's row: the input text, the tokens, the token ids or the
+    embeddings. Each row is built once per sentence and step.
+    """
+    pieces, token_ids = tokenize(sentence)
+    style = f"grid-template-columns: repeat({max(len(token_ids), 1)}, 1fr);"
+    if step == 0:
+        inner = f'<div class="input-text">{html.escape(sentence)}</div>'
+    elif step == 1:
+        inner = '<div class="arrow-row">&#x2193;</div>' + _pills(pieces, "pill")
+    elif step == 2:
+        inner = '<div class="arrow-row">&#x2193;</div>' + _pills(token_ids, "pill")
+    else:
+        inner = '<div class="arrow-row">&#x2193;</div>' + _embedding_pills(token_ids)
+    return f'<div class="pill-layout" style="{style}">{inner}</div>'
+
+def reset_step():
+    st.session_state.step = 0
+
+def advance_step():
+    st.session_state.step = 0 if st.session_state.step == max_step else st.session_state.step + 1
+
+step_label = ["Tokenize", "Lookup IDs", "Lookup Embeddings", "Reset"]
+
+@st.fragment
+def step_viewer():
+    # Widgets inside a fragment only rerun the fragment, and the buttons
+    # change the step in callbacks, so a click never reruns the whole page.
+    sentence = st.text_input("Sentence", value=EXAMPLE_SENTENCE, max_chars=200, on_change=reset_step)
+
+    left, middle, right = st.columns([1, 1, 1])
+
+    with middle:
+        with st.container():
+            # Inject CSS scoped to this column block
+            st.markdown("""
+            <style>
+            /* Target the first stButton inside this block only */
+            div[data-testid="stVerticalBlock"] div.stButton > button {
+                width: 170px;
+                height: 40px;
+            }
+            </style>
+            """, unsafe_allow_html=True)
+
+            st.button(step_label[st.session_state.step], on_click=advance_step)
+
+    try:
+        with section("build_html"):
+            layers = [build_layer(sentence, step) for step in range(st.session_state.step + 1)]
+    except TokenizerUnavailableError as e:
+        st.error(f"Only the example sentence can be shown without the tokenizer. {e}")
+        return
+    # One element per layer, so the earlier layers are unchanged when a step is added
+    for layer in layers:
+        st.markdown(layer, unsafe_allow_html=True)
+
+step_viewer()
+
+end_page()
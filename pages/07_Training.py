@@ -0,0 +1,98 @@
+import math
+
+import streamlit as st
+
+from utils.profiling import end_page, start_page
+from utils.tokenizers import require_encoding_for_model
+from utils.training import BigramTrainer, build_token_file, load_tokens
+
+start_page("Training")
+
+enc = require_encoding_for_model("gpt-4o")
+
+# Seconds of training per fragment rerun, and how often the fragment reruns
+CHUNK_SECONDS = 0.4
+RUN_EVERY = 0.5
+
+@st.cache_resource
+def load_corpus_tokens(path: str):
+    # Memory-mapped once and shared by all sessions; the path changes when the corpus does
+    return load_tokens(path)
+
+tokens = load_corpus_tokens(str(build_token_file(enc)))
+
+st.title("Training")
+st.markdown("""A language model learns by reading text and, at every position, predicting the next token. The **loss** measures how surprised the model was by the token that actually came next; training nudges the model's parameters a little after every batch of text so that the loss goes down.
+
+The model trained on this page is the simplest possible one: a **bigram model** that predicts the next token only from the previous token. It learns one row of scores (logits) per token, and a softmax turns a row into a probability distribution. Real models condition on thousands of previous tokens and have billions of parameters, but they are trained the same way: predict, measure the loss, adjust.""")
+
+col_lr, col_batch, col_budget = st.columns(3)
+with col_lr:
+    learning_rate = st.slider("Learning rate", min_value=0.01, max_value=0.5, value=0.2, step=0.01)
+with col_batch:
+    batch_size = st.select_slider("Batch size (tokens)", options=[1024, 2048, 4096, 8192, 16384, 32768, 65536], value=16384)
+with col_budget:
+    budget = st.slider("Tokens to train (millions)", min_value=1, max_value=50, value=5) * 1_000_000
+
+def reset_training():
+    st.session_state.trainer = BigramTrainer(tokens)
+    st.session_state.training = False
+
+def toggle_training():
+    st.session_state.training = not st.session_state.training
+
+if "trainer" not in st.session_state:
+    reset_training()
+trainer = st.session_state.trainer
+# Takes effect from the next step; the optimizer state is kept
+trainer.learning_rate = learning_rate
+trainer.batch_size = batch_size
+
+col_start, col_reset = st.columns(2)
+with col_start:
+    st.button("Pause" if st.session_state.training else "Train", on_click=toggle_training)
+with col_reset:
+    st.button("Reset", on_click=reset_training)
+
+@st.fragment(run_every=RUN_EVERY if st.session_state.training else None)
+def training_progress():
+    # Trains one short chunk per rerun of this fragment, so the rest of the
+    # page stays responsive while the loss curve grows
+    if st.session_state.training:
+        trainer.train(seconds=CHUNK_SECONDS, max_tokens=budget)
+        if trainer.tokens_seen >= budget:
+            st.session_state.training = False
+            st.rerun()
+
+    col_tokens, col_speed, col_loss = st.columns(3)
+    col_tokens.metric("Tokens seen", f"{trainer.tokens_seen:,}")
+    col_speed.metric("Tokens/sec", f"{trainer.tokens_per_second:,.0f}")
+    col_loss.metric("Loss", f"{trainer.history[-1][1]:.3f}" if trainer.history else "-")
+
+    if trainer.history:
+        st.line_chart(
+            {"Tokens seen": [t for t, _ in trainer.history], "Loss": [l for _, l in trainer.history]},
+            x="Tokens seen",
+            y="Loss"
+        )
+    st.caption(
+        f"The corpus has {len(tokens):,} tokens using {trainer.vocab_size:,} distinct token ids. "
+        f"Guessing uniformly among them gives a loss of {math.log(trainer.vocab_size):.2f}. "
+        "The corpus is small, so after a while the model has memorized it rather than learned language."
+    )
+
+    word = st.text_input("See what the model predicts after", value=" the")
+    word_ids = enc.encode(word, disallowed_special=())
+    if word_ids:
+        next_ids, probs = trainer.predict(word_ids[-1])
+        if len(next_ids):
+            st.table({
+                "Next token": [repr(enc.decode([t])) for t in next_ids.tolist()],
+                "Probability": [f"{p:.3f}" for p in probs.tolist()]
+            })
+        else:
+            st.write(f"`{enc.decode(word_ids[-1:])}` does not occur in the training text.")
+
+training_progress()
+
+end_page()
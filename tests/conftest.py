@@ -0,0 +1,36 @@
+import itertools
+
+import pytest
+import tiktoken
+import tiktoken_ext.openai_public as openai_public
+
+ENCODING_NAMES = ["r50k_base", "p50k_base", "cl100k_base", "o200k_base"]
+
+
+def _ranks():
+    """Single bytes plus merges of all pairs of common ASCII characters, so
+    that how a text is split into pieces changes its tokens."""
+    ranks = {bytes([i]): i for i in range(256)}
+    for pair in itertools.product(b"abZ1'/\n \t\r!.s", repeat=2):
+        ranks[bytes(pair)] = len(ranks)
+    return ranks
+
+
+@pytest.fixture(scope="session")
+def pattern_encodings():
+    """
+    Encodings with the real split patterns of the OpenAI encodings and a
+    small vocabulary, so tests run without downloading the BPE files.
+    """
+    encodings = {}
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(openai_public, "load_tiktoken_bpe", lambda *args, **kwargs: _ranks())
+        for name in ENCODING_NAMES:
+            spec = openai_public.ENCODING_CONSTRUCTORS[name]()
+            encodings[name] = tiktoken.Encoding(
+                name,
+                pat_str=spec["pat_str"],
+                mergeable_ranks=spec["mergeable_ranks"],
+                special_tokens={"<|endoftext|>": len(spec["mergeable_ranks"])}
+            )
+    return encodings
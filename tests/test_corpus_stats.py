@@ -0,0 +1,70 @@
+import mmap
+import random
+
+import numpy as np
+import pytest
+
+from utils import corpus_stats
+from utils.corpus_stats import CorpusStats, analyze, iter_chunks, snapshot_path
+
+
+def _corpus(tmp_path):
+    rng = random.Random(0)
+    pieces = ["a", "Z", "1", "'", "/", "\n", "\n\n", " ", "  ", "\t", "é", "!", ".", "s", "x'\n/usr", "\n \n"]
+    paths = []
+    for group in ["en", "de"]:
+        (tmp_path / group).mkdir()
+        path = tmp_path / group / "text.txt"
+        path.write_text("".join(rng.choice(pieces) for _ in range(3000)), encoding="utf-8")
+        paths.append(path)
+    return paths
+
+
+@pytest.mark.parametrize("name", ["r50k_base", "p50k_base", "cl100k_base", "o200k_base"])
+def test_segmented_counts_match_whole_files(pattern_encodings, monkeypatch, tmp_path, name):
+    monkeypatch.setattr(corpus_stats, "get_encoding", pattern_encodings.__getitem__)
+    enc = pattern_encodings[name]
+    paths = _corpus(tmp_path)
+
+    # Tiny segments, so files are cut at many boundaries
+    stats = analyze([tmp_path], name, workers=0, segment_bytes=64)
+
+    expected = np.zeros(enc.n_vocab, dtype=np.int64)
+    for path in paths:
+        expected += np.bincount(enc.encode(path.read_text(encoding="utf-8"), disallowed_special=()), minlength=enc.n_vocab)
+    assert (stats.token_counts == expected).all()
+    assert stats.total_tokens == expected.sum()
+
+
+def test_snapshots_round_trip(pattern_encodings, monkeypatch, tmp_path):
+    monkeypatch.setattr(corpus_stats, "get_encoding", pattern_encodings.__getitem__)
+    _corpus(tmp_path)
+    stats = analyze([tmp_path], "o200k_base", workers=0)
+    stats.save(tmp_path / "snapshot.npz")
+    loaded = CorpusStats.load(tmp_path / "snapshot.npz")
+
+    assert (loaded.token_counts == stats.token_counts).all()
+    assert loaded.by_group() == stats.by_group()
+    assert (loaded.merge(stats).token_counts == 2 * stats.token_counts).all()
+
+
+def test_chunks_are_capped_without_newlines(tmp_path):
+    # One long line: words, then multi-byte characters without any whitespace
+    data = ("héllo wörld " * 1000 + "é" * 5000).encode()
+    path = tmp_path / "line.txt"
+    path.write_bytes(data)
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        chunks = list(iter_chunks(mm, 0, len(data), chunk_bytes=64, max_bytes=256))
+    assert max(len(c.encode()) for c in chunks) <= 256
+    # No character is split across chunks
+    assert "".join(chunks) == data.decode()
+
+
+@pytest.mark.parametrize("name", ["../../x", "a/b", "", "a.b", "..", "x\n"])
+def test_snapshot_path_rejects_unsafe_names(name):
+    with pytest.raises(ValueError):
+        snapshot_path(name)
+
+
+def test_snapshot_path_accepts_plain_names():
+    assert snapshot_path("en_wiki-2024").name == "en_wiki-2024.npz"
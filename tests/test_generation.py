@@ -0,0 +1,55 @@
+import time
+
+import numpy as np
+
+from utils.generation import GenerationEngine, NGramModel
+
+
+class CountingModel:
+    def __init__(self, model):
+        self.model = model
+        self.vocab_size = model.vocab_size
+        self.calls = 0
+
+    def logits(self, contexts):
+        self.calls += 1
+        return self.model.logits(contexts)
+
+
+def _engine():
+    tokens = np.random.default_rng(0).integers(0, 50, 2000)
+    model = CountingModel(NGramModel(tokens, 1000))
+    return GenerationEngine(model), model
+
+
+def test_replay_reuses_distributions():
+    engine, model = _engine()
+    settings = dict(max_new_tokens=20, temperature=0.7, top_k=10, top_p=0.9, seed=1)
+    first = list(engine.generate([1, 2], **settings))
+    calls = model.calls
+    second = list(engine.generate([1, 2], **settings))
+
+    assert [s.token for s in first] == [s.token for s in second]
+    assert model.calls == calls
+    assert all(s.token in s.top_tokens for s in first)
+    # Other settings compute their own distribution
+    list(engine.generate([1, 2], max_new_tokens=1, temperature=1.5, seed=1))
+    assert model.calls == calls + 1
+
+
+def test_cache_is_bounded_by_bytes():
+    tokens = np.random.default_rng(0).integers(0, 50, 2000)
+    # No truncation, so every distribution covers the whole vocabulary
+    engine = GenerationEngine(NGramModel(tokens, 1000), cache_bytes=100_000)
+    for seed in range(20):
+        list(engine.generate([seed], max_new_tokens=5, seed=seed))
+    assert 0 < engine._cached_bytes <= 100_000
+    assert engine._cached_bytes == sum(d.nbytes for d in engine._distributions.values())
+
+
+def test_elapsed_excludes_consumer_time():
+    engine, _ = _engine()
+    step = None
+    for step in engine.generate([1, 2], max_new_tokens=5, seed=1):
+        time.sleep(0.05)
+    assert step.elapsed < 0.05
@@ -0,0 +1,36 @@
+import pytest
+
+from utils.logprobs import LogprobError, LogprobProvider, LogprobRequest, TopLogprobs
+
+
+class FailingProvider(LogprobProvider):
+    name = "failing"
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.calls = 0
+
+    async def _fetch_one(self, request):
+        self.calls += 1
+        if request.prompt == "bad":
+            raise ConnectionError("unreachable")
+        return TopLogprobs(tokens=["a"], logprobs=[0.0])
+
+
+def test_provider_is_abstract():
+    with pytest.raises(TypeError):
+        LogprobProvider()
+
+
+def test_failures_are_raised_as_logprob_errors():
+    provider = FailingProvider()
+    try:
+        with pytest.raises(LogprobError, match="failing: ConnectionError: unreachable"):
+            provider.fetch([LogprobRequest("bad")])
+        # The failed request is not left in flight, so it is tried again
+        with pytest.raises(LogprobError):
+            provider.fetch([LogprobRequest("bad")])
+        assert provider.calls == 2
+        assert provider.fetch([LogprobRequest("good")])[0].tokens == ["a"]
+    finally:
+        provider.close()
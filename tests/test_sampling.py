@@ -0,0 +1,144 @@
+import numpy as np
+import pytest
+
+from utils.sampling import (
+    AliasSampler,
+    batch_truncate,
+    build_alias_table,
+    build_pipeline,
+    min_p_grid,
+    min_p_scaling,
+    temperature_grid,
+    top_k_grid,
+    top_k_scaling,
+    top_p_grid,
+    top_p_scaling
+)
+
+# The Sampling page's default distribution; "book" and "question" tie
+PAGE_PROBABILITIES = np.array([0.45853809710312615, 0.40465845041054327, 0.07031908764647739, 0.015690313995143465, 0.015690313995143465, 0.012219628826053952, 0.010783784589726049, 0.0050938991521505715, 0.002406187582511743, 0.0006893842845350389])
+PAGE_PROBABILITIES = PAGE_PROBABILITIES / PAGE_PROBABILITIES.sum()
+
+
+def _reference(probs, top_k=None, top_p=None, min_p=None):
+    """Truncation of one row by sorting it and taking a cumulative sum."""
+    order = np.argsort(-probs, kind="stable")
+    sorted_probs = probs[order]
+    keep = np.ones(len(probs), dtype=bool)
+    if top_k is not None:
+        keep[top_k:] = False
+    sorted_probs = np.where(keep, sorted_probs, 0.0) / sorted_probs[keep].sum()
+    if top_p is not None:
+        preceding = np.cumsum(sorted_probs) - sorted_probs
+        keep &= preceding < top_p
+        keep[0] = True
+    if min_p is not None:
+        keep &= sorted_probs >= sorted_probs[0] * min_p
+    out = np.zeros(len(probs))
+    out[order[keep]] = sorted_probs[keep]
+    return out / out.sum()
+
+
+def _dense(indices, probs, vocab):
+    out = np.zeros((len(indices), vocab))
+    np.put_along_axis(out, indices, probs, axis=1)
+    return out
+
+
+def _rows(vocab=3000, batch=4):
+    rng = np.random.default_rng(0)
+    logits = rng.standard_normal((batch, vocab)) * np.array([[0.1], [1.0], [3.0], [8.0]])[:batch]
+    # Ties, including at typical cut-offs
+    logits[:, 5:15] = logits[:, :1]
+    return logits
+
+
+SETTINGS = [
+    dict(top_k=1),
+    dict(top_k=4),
+    dict(top_k=50),
+    dict(top_p=0.0),
+    dict(top_p=0.5),
+    dict(top_p=0.9),
+    dict(top_p=0.999),
+    dict(min_p=0.1),
+    dict(top_k=40, top_p=0.8),
+    dict(top_p=0.9, min_p=0.05),
+    dict(top_k=100, top_p=0.95, min_p=0.01)
+]
+
+
+@pytest.mark.parametrize("settings", SETTINGS)
+def test_batch_truncate_matches_reference(settings):
+    logits = _rows()
+    probs = np.exp(logits - logits.max(axis=1, keepdims=True))
+    probs /= probs.sum(axis=1, keepdims=True)
+    expected = np.array([_reference(row, **settings) for row in probs])
+
+    indices, kept = batch_truncate(logits, from_logits=True, **settings)
+    np.testing.assert_allclose(_dense(indices, kept, logits.shape[1]), expected, atol=1e-12)
+    indices, kept = batch_truncate(probs, **settings)
+    np.testing.assert_allclose(_dense(indices, kept, logits.shape[1]), expected, atol=1e-12)
+
+
+@pytest.mark.parametrize("settings", SETTINGS)
+def test_pipeline_matches_reference(settings):
+    logits = _rows()
+    temperature = 0.7
+    scaled = np.exp((logits - logits.max(axis=1, keepdims=True)) / temperature)
+    scaled /= scaled.sum(axis=1, keepdims=True)
+    expected = np.array([_reference(row, **settings) for row in scaled])
+
+    out = build_pipeline(temperature, **settings)(logits)
+    np.testing.assert_allclose(out, expected, atol=1e-12)
+
+
+def test_ties_keep_exactly_k():
+    logits = np.log(PAGE_PROBABILITIES)
+    assert np.count_nonzero(top_k_scaling(PAGE_PROBABILITIES, 4)) == 4
+    out = build_pipeline(top_k=4)(logits)
+    assert np.count_nonzero(out) == 4
+    # The lower index wins the tie
+    assert out[3] > 0 and out[4] == 0
+
+
+def test_top_p_zero_keeps_one_token():
+    out = top_p_scaling(np.array([0.5, 0.3, 0.2]), 0.0)
+    np.testing.assert_array_equal(out, [1.0, 0.0, 0.0])
+
+
+def test_grids_match_scalar_functions():
+    probs = PAGE_PROBABILITIES
+    ks = np.arange(1, len(probs) + 1)
+    ps = np.round(np.arange(0.01, 1.0 + 1e-9, 0.01), 2)
+    temperatures = np.array([0.01, 0.5, 1.0, 2.0])
+
+    for k, row in zip(ks, top_k_grid(probs, ks)):
+        np.testing.assert_allclose(row, top_k_scaling(probs, k), atol=1e-12)
+    for p, row in zip(ps, top_p_grid(probs, ps)):
+        np.testing.assert_allclose(row, top_p_scaling(probs, p), atol=1e-12)
+    for p, row in zip(ps, min_p_grid(probs, ps)):
+        np.testing.assert_allclose(row, min_p_scaling(probs, p), atol=1e-12)
+    for t, row in zip(temperatures, temperature_grid(probs, temperatures)):
+        scaled = probs ** (1 / t)
+        np.testing.assert_allclose(row, scaled / scaled.sum(), atol=1e-12)
+
+
+@pytest.mark.parametrize("probs", [
+    PAGE_PROBABILITIES,
+    np.full(7, 1 / 7),
+    np.array([1.0, 0.0, 0.0, 0.0]),
+    np.random.default_rng(0).dirichlet(np.full(1000, 0.1))
+])
+def test_alias_table_reproduces_distribution(probs):
+    prob, alias = build_alias_table(probs)
+    n = len(probs)
+    # Every column contributes prob to itself and the rest to its alias
+    implied = np.bincount(np.arange(n), weights=prob, minlength=n)
+    implied += np.bincount(alias, weights=1.0 - prob, minlength=n)
+    np.testing.assert_allclose(implied / n, probs / probs.sum(), atol=1e-12)
+
+    draws = AliasSampler(seed=0).draw(probs, size=200_000)
+    assert set(np.unique(draws)) <= set(np.flatnonzero(probs))
+    if n <= 10:
+        np.testing.assert_allclose(np.bincount(draws, minlength=n) / len(draws), probs, atol=0.005)
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from utils.embeddings import EmbeddingStore, build_store
+from utils.similarity import ExactIndex, LSHIndex, analogy
+
+
+@pytest.fixture
+def store(tmp_path):
+    rng = np.random.default_rng(0)
+    build_store(rng.standard_normal((200, 16)), np.arange(200) * 3 + 100, tmp_path)
+    return EmbeddingStore(tmp_path)
+
+
+def test_exact_search_matches_brute_force(store):
+    rng = np.random.default_rng(1)
+    queries = rng.standard_normal((3, store.dim))
+    vectors = store.get_rows(np.arange(len(store)))
+    cosine = (queries / np.linalg.norm(queries, axis=1, keepdims=True)) @ (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).T
+    token_ids, scores = ExactIndex(store).search(queries, k=5)
+    assert (token_ids == store.token_ids[np.argsort(-cosine, axis=1)[:, :5]]).all()
+    np.testing.assert_allclose(scores, np.sort(cosine, axis=1)[:, ::-1][:, :5], rtol=1e-3)
+
+
+def test_lsh_search_does_not_pad_with_row_zero(store):
+    # Many bits and one table, so buckets hold only a few rows
+    index = LSHIndex.build(store, n_bits=16, n_tables=1)
+    query = store.get_rows([3])[0]
+    token_ids, scores = index.search(query, k=50, probe_neighbours=False)
+    found = token_ids[0] >= 0
+    assert found.sum() < 50
+    assert np.isin(token_ids[0][found], index.store.token_ids[index.candidates(query / np.linalg.norm(query), False)]).all()
+    assert np.isneginf(scores[0][~found]).all()
+
+    ids, _ = analogy(index, *store.token_ids[:3].tolist(), k=50)
+    assert (ids >= 0).all()
+
+
+def test_exact_index_searches_the_mapped_rows(store):
+    # The normalized rows stay on disk instead of being copied into the index
+    assert isinstance(store.normalized, np.memmap)
+    assert not any(isinstance(v, np.ndarray) and v.size >= store.normalized.size for v in vars(ExactIndex(store)).values())
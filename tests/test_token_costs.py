@@ -0,0 +1,39 @@
+import functools
+import io
+import json
+
+import numpy as np
+
+from utils import token_costs, tokenization
+from utils.token_costs import TokenCounter, iter_prompts
+
+TEXT = "x'\n/usr/bin\n\nfirst line\nsecond  line\n\tindented\n!done\n" * 40
+
+
+def test_chunked_text_files_count_like_whole_files(pattern_encodings, monkeypatch):
+    monkeypatch.setattr(token_costs, "get_encoding", pattern_encodings.__getitem__)
+    # Small chunks, so every text file is read as many chunks across batches
+    monkeypatch.setattr(token_costs, "iter_file_chunks", functools.partial(tokenization.iter_file_chunks, chunk_bytes=64))
+    files = [
+        ("a.txt", TEXT),
+        ("b.jsonl", "\n".join(json.dumps({"prompt": p}) for p in ["one", "two\n/x", ""]) + "\n"),
+        ("c.txt", ""),
+        ("d.txt", TEXT[:300]),
+    ]
+    expected = [TEXT, "one", "two\n/x", "", "", TEXT[:300]]
+
+    def prompts():
+        for name, text in files:
+            yield from iter_prompts(io.BytesIO(text.encode()), name)
+
+    encodings = ["o200k_base", "r50k_base"]
+    batches = []
+    totals = TokenCounter(workers=0, batch_size=3).count(prompts(), encodings, on_batch=batches.append)
+
+    assert totals.prompts == len(expected)
+    assert totals.characters == sum(map(len, expected))
+    for name in encodings:
+        per_prompt = [len(pattern_encodings[name].encode_ordinary(p)) for p in expected]
+        assert np.concatenate([b[name] for b in batches]).tolist() == per_prompt
+        assert totals.tokens[name] == sum(per_prompt)
+        assert totals.max_tokens[name] == max(per_prompt)
@@ -0,0 +1,46 @@
+import io
+import random
+
+import pytest
+
+from utils.tokenization import ChunkedTokenizer, iter_file_chunks, split_into_chunks
+
+TEXTS = [
+    "x'\n/usr/bin\n/etc",
+    "a\n\nb\n\n\nc\n \nd",
+    "line one\nline two  \n\tindented\n/path\n\n\nend\n",
+    "print('hi')\n/* comment */\n!important\n\n.done",
+]
+
+
+def _random_text(rng, length):
+    pieces = ["a", "b", "Z", "1", "'", "/", "\n", "\n\n", " ", "  ", "\t", "\r", "é", "!", ".", "s"]
+    return "".join(rng.choice(pieces) for _ in range(length))
+
+
+@pytest.mark.parametrize("name", ["r50k_base", "p50k_base", "cl100k_base", "o200k_base"])
+def test_chunked_encoding_matches_whole_text(pattern_encodings, name):
+    enc = pattern_encodings[name]
+    rng = random.Random(0)
+    texts = TEXTS + [_random_text(rng, rng.randint(1, 40)) for _ in range(2000)]
+    # chunk_size=1 cuts at every safe boundary
+    tokenizer = ChunkedTokenizer(enc, chunk_size=1, num_threads=1)
+    for text in texts:
+        assert tokenizer.encode(text).tokens.tolist() == enc.encode(text, disallowed_special=()), repr(text)
+
+
+def test_split_into_chunks_keeps_text():
+    text = "\n".join(TEXTS) * 10
+    chunks = split_into_chunks(text, chunk_size=8)
+    assert "".join(chunks) == text
+    assert len(chunks) > 1
+
+
+def test_file_chunks_are_capped_without_newlines():
+    # One long line: words, then multi-byte characters without any whitespace
+    data = ("héllo wörld " * 1000 + "é" * 5000).encode()
+    chunks = list(iter_file_chunks(io.BytesIO(data), chunk_bytes=64))
+    assert max(size for _, size in chunks) < 64 * 5
+    assert sum(size for _, size in chunks) == len(data)
+    # No character is split across chunks
+    assert "".join(text for text, _ in chunks) == data.decode()
@@ -0,0 +1,36 @@
+import pytest
+import tiktoken
+
+from utils import tokenizers
+
+
+def test_missing_encoding_raises_once(monkeypatch):
+    calls = []
+
+    def offline(name):
+        calls.append(name)
+        raise ConnectionError("no network")
+
+    monkeypatch.setattr(tiktoken, "get_encoding", offline)
+    monkeypatch.setattr(tokenizers, "_errors", {})
+    for _ in range(2):
+        with pytest.raises(tokenizers.TokenizerUnavailableError, match="python -m utils.tokenizers missing_base"):
+            tokenizers.get_encoding("missing_base")
+    # The failure is remembered instead of downloading again
+    assert calls == ["missing_base"]
+
+
+def test_missing_encoding_is_retried(monkeypatch, pattern_encodings):
+    def offline(name):
+        raise ConnectionError("no network")
+
+    monkeypatch.setattr(tiktoken, "get_encoding", offline)
+    monkeypatch.setattr(tokenizers, "_errors", {})
+    monkeypatch.setattr(tokenizers, "_encodings", {})
+    with pytest.raises(tokenizers.TokenizerUnavailableError):
+        tokenizers.get_encoding("r50k_base")
+
+    # The file has since been added to the cache directory
+    monkeypatch.setattr(tiktoken, "get_encoding", pattern_encodings.__getitem__)
+    monkeypatch.setattr(tokenizers, "RETRY_SECONDS", 0.0)
+    assert tokenizers.get_encoding("r50k_base") is pattern_encodings["r50k_base"]
@@ -0,0 +1,21 @@
+import os
+
+from utils import training
+from utils.training import build_token_file, load_tokens
+
+
+def test_token_file_is_rebuilt_when_the_corpus_changes(pattern_encodings, tmp_path, monkeypatch):
+    monkeypatch.setattr(training, "TRAINING_DIR", tmp_path / "training")
+    enc = pattern_encodings["o200k_base"]
+    corpus = tmp_path / "corpus.txt"
+    corpus.write_text("the first corpus")
+
+    first = build_token_file(enc, corpus)
+    assert build_token_file(enc, corpus) == first
+
+    corpus.write_text("a different corpus")
+    os.utime(corpus, ns=(1, 1))
+    second = build_token_file(enc, corpus)
+    assert second != first
+    assert not first.exists()
+    assert load_tokens(second).tolist() == enc.encode("a different corpus")
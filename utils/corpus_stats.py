@@ -0,0 +1,277 @@
+"""
+Token statistics of whole corpora: token frequencies, token lengths,
+characters per token per file and group, and rare tokens.
+
+Files are memory-mapped and split into segments at safe tokenization
+boundaries. Segments are encoded in streaming chunks, in parallel on a
+process pool, and every segment's token counts are accumulated with
+np.bincount into one vocabulary-sized array. The merged result is saved as
+a compressed .npz snapshot that loads in milliseconds.
+
+    python -m utils.corpus_stats path/to/corpus --name corpus
+
+A file's group is the name of the directory it is in, so a corpus laid out
+as en/, de/, ... is summarized per language.
+"""
+import mmap
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+from utils.profiling import timed
+from utils.tokenization import SAFE_BYTE_BOUNDARY, fallback_cut, token_byte_lengths
+from utils.tokenizers import get_encoding
+
+CORPUS_DIR = Path(os.environ.get("LLM_EXPLORER_CORPUS_DIR", Path(__file__).resolve().parent.parent / "assets"))
+CORPUS_STATS_DIR = Path(__file__).resolve().parent.parent / "cache" / "corpus_stats"
+
+TEXT_SUFFIXES = [".txt", ".md", ".jsonl", ".csv", ".json", ".html", ".py"]
+
+CHUNK_BYTES = 4 << 20
+# Chunks without a safe boundary are cut at this size
+MAX_CHUNK_BYTES = 16 << 20
+SEGMENT_BYTES = 64 << 20
+
+# Snapshot names become file names, so they can't contain path separators
+SNAPSHOT_NAME = re.compile(r"[\w-]+")
+
+
+def _cut(mm, position: int, end: int, limit: int = None) -> int:
+    """
+    The first safe boundary at or after position, or end if there is none.
+    If there is none before limit either, the text is cut at limit with
+    fallback_cut instead.
+    """
+    if position >= end:
+        return end
+    stop = end if limit is None else min(end, max(limit, position))
+    match = SAFE_BYTE_BOUNDARY.search(mm, position, stop)
+    if match:
+        return match.end()
+    return end if stop == end else fallback_cut(mm, position, stop)
+
+
+def iter_chunks(mm, start: int, end: int, chunk_bytes: int = CHUNK_BYTES, max_bytes: int = MAX_CHUNK_BYTES):
+    """
+    Yields the text of mm[start:end] in chunks of about chunk_bytes, cut at
+    safe boundaries. A chunk is never longer than max_bytes, so text without
+    newlines is still decoded and encoded a piece at a time.
+    """
+    while start < end:
+        stop = _cut(mm, start + chunk_bytes, end, start + max_bytes)
+        yield mm[start:stop].decode("utf-8", errors="replace")
+        start = stop
+
+
+def segments(path, segment_bytes: int = SEGMENT_BYTES):
+    """(start, end) byte ranges of a file, cut at safe boundaries."""
+    size = os.path.getsize(path)
+    if size == 0:
+        return []
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        bounds = [0]
+        while bounds[-1] < size:
+            bounds.append(_cut(mm, bounds[-1] + segment_bytes, size))
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def iter_files(paths):
+    """Expands directories into the text files inside them, recursively."""
+    for path in map(Path, paths):
+        if path.is_dir():
+            yield from sorted(p for p in path.rglob("*") if p.is_file() and p.suffix.lower() in TEXT_SUFFIXES)
+        else:
+            yield path
+
+
+@dataclass
+class CorpusStats:
+    encoding: str
+    # Occurrences of every token id, len == n_vocab
+    token_counts: np.ndarray
+    files: np.ndarray
+    groups: np.ndarray
+    file_bytes: np.ndarray
+    file_chars: np.ndarray
+    file_tokens: np.ndarray
+
+    @property
+    def total_tokens(self) -> int:
+        return int(self.file_tokens.sum())
+
+    @property
+    def chars_per_token(self) -> float:
+        return float(self.file_chars.sum() / max(self.total_tokens, 1))
+
+    def top_tokens(self, k: int = 20):
+        """(ids, counts) of the k most frequent tokens."""
+        k = min(k, int(np.count_nonzero(self.token_counts)))
+        ids = np.argpartition(-self.token_counts, k - 1)[:k] if k else np.empty(0, dtype=np.int64)
+        ids = ids[np.argsort(-self.token_counts[ids], kind="stable")]
+        return ids, self.token_counts[ids]
+
+    def rare_tokens(self, max_count: int = 1):
+        """Ids of the tokens seen at least once and at most max_count times."""
+        return np.flatnonzero((self.token_counts > 0) & (self.token_counts <= max_count))
+
+    def length_histogram(self, enc) -> np.ndarray:
+        """Number of tokens in the corpus by token length in bytes."""
+        return np.bincount(token_byte_lengths(enc), weights=self.token_counts).astype(np.int64)
+
+    def by_group(self):
+        """{group: (chars, tokens)}."""
+        names, index = np.unique(self.groups, return_inverse=True)
+        chars = np.bincount(index, weights=self.file_chars, minlength=len(names))
+        tokens = np.bincount(index, weights=self.file_tokens, minlength=len(names))
+        return {str(n): (int(c), int(t)) for n, c, t in zip(names, chars, tokens)}
+
+    def merge(self, other: "CorpusStats") -> "CorpusStats":
+        """Both corpora together; the files are concatenated."""
+        if other.encoding != self.encoding:
+            raise ValueError(f"Cannot merge {other.encoding} statistics into {self.encoding}")
+        return CorpusStats(
+            encoding=self.encoding,
+            token_counts=self.token_counts + other.token_counts,
+            files=np.concatenate([self.files, other.files]),
+            groups=np.concatenate([self.groups, other.groups]),
+            file_bytes=np.concatenate([self.file_bytes, other.file_bytes]),
+            file_chars=np.concatenate([self.file_chars, other.file_chars]),
+            file_tokens=np.concatenate([self.file_tokens, other.file_tokens])
+        )
+
+    def save(self, path):
+        np.savez_compressed(
+            path,
+            encoding=np.array(self.encoding),
+            token_counts=self.token_counts,
+            files=self.files,
+            groups=self.groups,
+            file_bytes=self.file_bytes,
+            file_chars=self.file_chars,
+            file_tokens=self.file_tokens
+        )
+
+    @classmethod
+    def load(cls, path) -> "CorpusStats":
+        with np.load(path) as data:
+            return cls(
+                encoding=str(data["encoding"]),
+                token_counts=data["token_counts"],
+                files=data["files"],
+                groups=data["groups"],
+                file_bytes=data["file_bytes"],
+                file_chars=data["file_chars"],
+                file_tokens=data["file_tokens"]
+            )
+
+
+def _analyze_segment(path: str, start: int, end: int, encoding: str, chunk_bytes: int = CHUNK_BYTES):
+    """
+    Runs in a worker: returns (token ids, their counts, characters) of one
+    segment. Only the ids that occur are returned, to keep results small.
+    """
+    # get_encoding loads the encoding once per worker process
+    enc = get_encoding(encoding)
+    counts = np.zeros(enc.n_vocab, dtype=np.int64)
+    chars = 0
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for text in iter_chunks(mm, start, end, chunk_bytes):
+            chars += len(text)
+            tokens = np.asarray(enc.encode(text, disallowed_special=()), dtype=np.int64)
+            counts += np.bincount(tokens, minlength=enc.n_vocab)
+    ids = np.flatnonzero(counts)
+    return ids, counts[ids], chars
+
+
+@timed()
+def analyze(paths, encoding: str = "o200k_base", workers: int = None, on_progress=None,
+            segment_bytes: int = SEGMENT_BYTES, mp_context: str = "spawn") -> CorpusStats:
+    """
+    Computes the statistics of all text files in paths (files or
+    directories). on_progress(bytes done, total bytes) is called as
+    segments finish. workers=0 runs everything in the calling process.
+    """
+    files = list(iter_files(paths))
+    tasks = [(i, str(path), start, end) for i, path in enumerate(files) for start, end in segments(path, segment_bytes)]
+    total = sum(end - start for _, _, start, end in tasks)
+    n_vocab = get_encoding(encoding).n_vocab
+
+    token_counts = np.zeros(n_vocab, dtype=np.int64)
+    file_chars = np.zeros(len(files), dtype=np.int64)
+    file_tokens = np.zeros(len(files), dtype=np.int64)
+    done = 0
+
+    def collect(task, result):
+        nonlocal done
+        index, _, start, end = task
+        ids, counts, chars = result
+        # Partial results hold distinct ids, so they are added without a loop
+        token_counts[ids] += counts
+        file_chars[index] += chars
+        file_tokens[index] += counts.sum()
+        done += end - start
+        if on_progress is not None:
+            on_progress(done, total)
+
+    workers = multiprocessing.cpu_count() if workers is None else workers
+    if workers == 0:
+        for task in tasks:
+            collect(task, _analyze_segment(*task[1:], encoding))
+    else:
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context(mp_context)) as pool:
+            futures = {pool.submit(_analyze_segment, *task[1:], encoding): task for task in tasks}
+            for future in as_completed(futures):
+                collect(futures[future], future.result())
+
+    return CorpusStats(
+        encoding=encoding,
+        token_counts=token_counts,
+        files=np.array([str(p) for p in files]),
+        groups=np.array([p.parent.name for p in files]),
+        file_bytes=np.array([p.stat().st_size for p in files], dtype=np.int64),
+        file_chars=file_chars,
+        file_tokens=file_tokens
+    )
+
+
+def snapshot_path(name: str) -> Path:
+    """The file of the named snapshot. Raises ValueError for names other than letters, digits, _ and -."""
+    if not SNAPSHOT_NAME.fullmatch(name):
+        raise ValueError(f"Invalid snapshot name {name!r}: use only letters, digits, _ and -")
+    return CORPUS_STATS_DIR / f"{name}.npz"
+
+
+def list_snapshots():
+    return sorted(p.stem for p in CORPUS_STATS_DIR.glob("*.npz") if SNAPSHOT_NAME.fullmatch(p.stem))
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Compute token statistics of a corpus and save a snapshot.")
+    parser.add_argument("paths", nargs="+", help="text files or directories")
+    parser.add_argument("--name", required=True, help="snapshot name")
+    parser.add_argument("--encoding", default="o200k_base")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    try:
+        path = snapshot_path(args.name)
+    except ValueError as e:
+        parser.error(str(e))
+
+    stats = analyze(
+        args.paths,
+        args.encoding,
+        args.workers,
+        on_progress=lambda done, total: print(f"\r{done / max(total, 1):6.1%}", end="", file=sys.stderr)
+    )
+    print(file=sys.stderr)
+    CORPUS_STATS_DIR.mkdir(parents=True, exist_ok=True)
+    stats.save(path)
+    print(f"{len(stats.files)} files, {stats.total_tokens:,} tokens, {stats.chars_per_token:.2f} chars/token")
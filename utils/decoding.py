@@ -0,0 +1,108 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+from utils.profiling import timed
+from utils.sampling import logsumexp, top_k_indices
+
+
+@dataclass
+class Hypothesis:
+    tokens: list
+    log_prob: float
+    score: float
+
+
+def _log_softmax(logits):
+    return logits - logsumexp(logits, axis=1, keepdims=True)
+
+
+def _length_normalized(log_prob, length, length_penalty):
+    return float(log_prob / max(length, 1) ** length_penalty)
+
+
+@timed()
+def greedy_search(model, prefix, max_new_tokens: int = 20, length_penalty: float = 1.0, stop_tokens=()) -> Hypothesis:
+    """
+    Always picks the most probable next token. The score is normalized the
+    same way as in beam_search, so the two can be compared.
+    """
+    context = list(prefix)
+    tokens = []
+    log_prob = 0.0
+    for _ in range(max_new_tokens):
+        log_probs = _log_softmax(model.logits([context]))[0]
+        token = int(log_probs.argmax())
+        log_prob += float(log_probs[token])
+        tokens.append(token)
+        context.append(token)
+        if token in stop_tokens:
+            break
+    return Hypothesis(tokens, log_prob, _length_normalized(log_prob, len(tokens), length_penalty))
+
+
+@timed()
+def beam_search(model, prefix, num_beams: int = 4, max_new_tokens: int = 20, length_penalty: float = 1.0,
+                stop_tokens=(), early_stopping: bool = True):
+    """
+    Keeps the num_beams most probable continuations at every step.
+
+    All beams are scored together as one (beams, vocab) matrix, and the next
+    beams are picked from the flattened beams x vocab scores with partial
+    selection. Hypotheses are ranked by log-probability divided by
+    length ** length_penalty.
+
+    Finished hypotheses (ending in a stop token, or reaching max_new_tokens)
+    are collected until there are num_beams of them. With early_stopping the
+    search ends there; otherwise it continues until no running beam can
+    still beat the worst finished one.
+
+    Returns the finished hypotheses, best first.
+    """
+    prefix = list(prefix)
+    beams = np.empty((1, 0), dtype=np.int64)
+    beam_log_probs = np.zeros(1)
+    finished = []
+    stop_tokens = np.asarray(list(stop_tokens), dtype=np.int64)
+
+    for step in range(max_new_tokens):
+        contexts = [prefix + row.tolist() for row in beams]
+        scores = beam_log_probs[:, None] + _log_softmax(model.logits(contexts))
+        vocab = scores.shape[1]
+
+        # 2 * num_beams candidates, so enough remain if some of them finish
+        flat, candidate_log_probs = top_k_indices(scores.reshape(1, -1), 2 * num_beams)
+        flat, candidate_log_probs = flat[0], candidate_log_probs[0]
+        source, token = np.divmod(flat, vocab)
+        candidates = np.concatenate([beams[source], token[:, None]], axis=1)
+
+        ends = np.isin(token, stop_tokens)
+        finished += [
+            Hypothesis(row.tolist(), float(log_prob), _length_normalized(log_prob, step + 1, length_penalty))
+            for row, log_prob in zip(candidates[ends], candidate_log_probs[ends])
+        ]
+        finished = sorted(finished, key=lambda h: h.score, reverse=True)[:num_beams]
+
+        running = ~ends
+        beams = candidates[running][:num_beams]
+        beam_log_probs = candidate_log_probs[running][:num_beams]
+
+        if len(finished) >= num_beams:
+            if early_stopping or len(beams) == 0:
+                break
+            # Log-probabilities only decrease, so this is the best a running
+            # beam can still reach
+            longest = max_new_tokens if length_penalty > 0 else step + 1
+            best_possible = _length_normalized(beam_log_probs[0], longest, length_penalty)
+            if best_possible <= finished[-1].score:
+                break
+        if len(beams) == 0:
+            break
+    else:
+        # Beams still running after max_new_tokens count as finished too
+        finished += [
+            Hypothesis(row.tolist(), float(log_prob), _length_normalized(log_prob, beams.shape[1], length_penalty))
+            for row, log_prob in zip(beams, beam_log_probs)
+        ]
+
+    return sorted(finished, key=lambda h: h.score, reverse=True)[:num_beams]
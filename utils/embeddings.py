@@ -0,0 +1,107 @@
+from pathlib import Path
+
+import numpy as np
+
+from utils.profiling import timed
+
+# On-disk layout of an embedding store directory:
+#   embeddings.npy  (rows, dim) float16 or int8 matrix, memory-mapped on load
+#   scales.npy      (rows,) float32 per-row scales, only for int8
+#   token_ids.npy   (rows,) token id stored in each row
+#   normalized.npy  (rows, dim) float16 unit-length rows, for cosine search
+EMBEDDING_STORE_DIR = Path(__file__).resolve().parent.parent / "assets" / "embeddings"
+
+
+def quantize_int8(embeddings: np.ndarray):
+    """
+    Symmetric per-row int8 quantization.
+    Returns the int8 matrix and the float32 scale of each row.
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    scales = np.abs(embeddings).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    quantized = np.rint(embeddings / scales[:, None]).astype(np.int8)
+    return quantized, scales.astype(np.float32)
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """The rows of matrix scaled to unit length, as float32; zero rows stay zero."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def build_store(embeddings, token_ids, path=EMBEDDING_STORE_DIR, dtype: str = "float16"):
+    """Writes an embedding store directory from a (rows, dim) matrix and the token id of each row."""
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+
+    if dtype == "int8":
+        stored, scales = quantize_int8(embeddings)
+        np.save(path / "scales.npy", scales)
+    elif dtype == "float16":
+        stored = np.asarray(embeddings, dtype=np.float16)
+        (path / "scales.npy").unlink(missing_ok=True)
+    else:
+        raise ValueError(f"Unsupported dtype: {dtype}")
+    np.save(path / "embeddings.npy", stored)
+
+    # Normalized from the stored values, so cosine search ranks exactly what
+    # the store holds. Per-row int8 scales cancel out.
+    np.save(path / "normalized.npy", normalize_rows(stored).astype(np.float16))
+    np.save(path / "token_ids.npy", np.asarray(token_ids, dtype=np.int64))
+
+
+class EmbeddingStore:
+    """
+    Read-only embedding matrix memory-mapped from an embedding store
+    directory. Rows are only read from disk when gathered, and the pages
+    are shared between every process that maps the same file.
+    """
+
+    @timed("EmbeddingStore.load")
+    def __init__(self, path=EMBEDDING_STORE_DIR):
+        path = Path(path)
+        self.matrix = np.load(path / "embeddings.npy", mmap_mode="r")
+        self.normalized = np.load(path / "normalized.npy", mmap_mode="r")
+        scales_path = path / "scales.npy"
+        self.scales = np.load(scales_path) if scales_path.exists() else None
+        self.token_ids = np.load(path / "token_ids.npy")
+
+        # Dense id -> row lookup table; -1 marks ids without an embedding.
+        self._row_of = np.full(int(self.token_ids.max()) + 1, -1, dtype=np.int64)
+        self._row_of[self.token_ids] = np.arange(len(self.token_ids))
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    @property
+    def dim(self) -> int:
+        return self.matrix.shape[1]
+
+    def __contains__(self, token_id) -> bool:
+        return 0 <= token_id < len(self._row_of) and self._row_of[token_id] >= 0
+
+    def rows(self, token_ids) -> np.ndarray:
+        """Maps token ids to row numbers, raising KeyError for unknown ids."""
+        token_ids = np.asarray(token_ids, dtype=np.int64)
+        in_range = (token_ids >= 0) & (token_ids < len(self._row_of))
+        rows = np.where(in_range, self._row_of[np.where(in_range, token_ids, 0)], -1)
+        if (rows < 0).any():
+            raise KeyError(f"No embedding for token ids {token_ids[rows < 0].tolist()}")
+        return rows
+
+    @timed()
+    def get_rows(self, rows) -> np.ndarray:
+        """Gathers and dequantizes the given rows as float32."""
+        rows = np.asarray(rows, dtype=np.int64)
+        out = self.matrix[rows].astype(np.float32)
+        if self.scales is not None:
+            out *= self.scales[rows, None]
+        return out
+
+    def get(self, token_ids) -> np.ndarray:
+        """Returns the (n, dim) float32 embeddings of the given token ids."""
+        return self.get_rows(self.rows(token_ids))
+
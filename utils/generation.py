@@ -0,0 +1,187 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from utils.profiling import timed
+from utils.sampling import build_pipeline, top_k_indices
+
+CORPUS_PATH = Path(__file__).resolve().parent.parent / "assets" / "corpus.txt"
+
+
+class NGramModel:
+    """
+    Local stand-in for a language model: an n-gram model over a token corpus.
+
+    The next-token distribution mixes the continuations of the longest
+    context seen in the corpus with a smoothed unigram distribution, so every
+    token of the vocabulary keeps a non-zero probability.
+
+    Like any next-token model used by the generation and decoding code, it
+    has a vocab_size and a logits(contexts) method returning a
+    (len(contexts), vocab_size) array.
+    """
+
+    def __init__(self, tokens, vocab_size: int, order: int = 3, interpolation: float = 0.9, smoothing: float = 0.01):
+        tokens = np.asarray(tokens, dtype=np.int64)
+        self.vocab_size = vocab_size
+        self.order = order
+        self.interpolation = interpolation
+
+        unigram = np.bincount(tokens, minlength=vocab_size) + smoothing
+        self.unigram = unigram / unigram.sum()
+
+        # tables[m] maps an m-token context to (next token ids, probabilities)
+        self.tables = {}
+        for m in range(1, order):
+            if len(tokens) <= m:
+                break
+            windows, counts = np.unique(sliding_window_view(tokens, m + 1), axis=0, return_counts=True)
+            contexts, following = windows[:, :m], windows[:, m]
+            starts = np.flatnonzero(np.r_[True, np.any(contexts[1:] != contexts[:-1], axis=1)])
+            ends = np.r_[starts[1:], len(windows)]
+            table = {}
+            for start, end in zip(starts.tolist(), ends.tolist()):
+                group = counts[start:end]
+                table[tuple(contexts[start].tolist())] = (following[start:end], group / group.sum())
+            self.tables[m] = table
+
+    @classmethod
+    def from_text(cls, text: str, enc, **kwargs):
+        return cls(enc.encode(text, disallowed_special=()), enc.n_vocab, **kwargs)
+
+    def probabilities(self, context):
+        for m in range(min(self.order - 1, len(context)), 0, -1):
+            found = self.tables.get(m, {}).get(tuple(context[-m:]))
+            if found is not None:
+                following, conditional = found
+                probs = self.unigram * (1 - self.interpolation)
+                probs[following] += self.interpolation * conditional
+                return probs
+        return self.unigram.copy()
+
+    def logits(self, contexts):
+        return np.log(np.stack([self.probabilities(c) for c in contexts]))
+
+
+@dataclass
+class GenerationStep:
+    index: int
+    token: int
+    probability: float
+    top_tokens: np.ndarray
+    top_probabilities: np.ndarray
+    elapsed: float
+
+    @property
+    def tokens_per_second(self) -> float:
+        return (self.index + 1) / self.elapsed if self.elapsed > 0 else float("inf")
+
+
+@dataclass
+class _Distribution:
+    """A processed next-token distribution, stored over the tokens it can sample only."""
+    tokens: np.ndarray
+    cumulative: np.ndarray
+    top_tokens: np.ndarray
+    top_probabilities: np.ndarray
+
+    @property
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in (self.tokens, self.cumulative, self.top_tokens, self.top_probabilities))
+
+    def probability(self, i: int) -> float:
+        return float(self.cumulative[i] - (self.cumulative[i - 1] if i else 0.0))
+
+
+class GenerationEngine:
+    """
+    Streams tokens from a next-token model, applying the sampling processors
+    at every step.
+
+    The processed distributions are cached by the prefix and the sampling
+    settings, so rewinding to an earlier step and generating a different
+    branch only computes distributions it hasn't seen. Only the tokens a
+    distribution can sample are stored, and the least recently used
+    distributions are evicted once the cache holds more than cache_bytes.
+    The cache is shared by all callers and guarded by a lock.
+    """
+
+    def __init__(self, model, cache_bytes: int = 64 << 20, top_n: int = 10):
+        self.model = model
+        self.cache_bytes = cache_bytes
+        self.top_n = top_n
+        self._distributions = OrderedDict()
+        self._cached_bytes = 0
+        self._lock = threading.Lock()
+
+    @timed()
+    def logits(self, prefix):
+        return self.model.logits([tuple(prefix)])[0]
+
+    def _distribution(self, prefix, settings, pipeline, probs) -> _Distribution:
+        """The distribution after prefix for the given settings; probs is a scratch buffer."""
+        key = (tuple(prefix), settings)
+        with self._lock:
+            found = self._distributions.get(key)
+            if found is not None:
+                self._distributions.move_to_end(key)
+                return found
+
+        pipeline(self.logits(prefix), out=probs)
+        tokens = np.flatnonzero(probs).astype(np.int32)
+        top_tokens, top_probabilities = top_k_indices(probs, self.top_n)
+        found = _Distribution(
+            tokens=tokens,
+            cumulative=np.cumsum(probs[tokens]),
+            top_tokens=top_tokens[0],
+            top_probabilities=top_probabilities[0]
+        )
+        if found.nbytes > self.cache_bytes:
+            return found
+        with self._lock:
+            if key not in self._distributions:
+                self._distributions[key] = found
+                self._cached_bytes += found.nbytes
+            while self._cached_bytes > self.cache_bytes:
+                _, evicted = self._distributions.popitem(last=False)
+                self._cached_bytes -= evicted.nbytes
+        return found
+
+    def generate(self, prefix, max_new_tokens: int = 20, temperature=None, top_k=None, top_p=None,
+                 min_p=None, stop_tokens=(), seed=None):
+        """
+        Yields one GenerationStep per generated token, starting from the
+        token ids in prefix. A step's elapsed time only counts the engine's
+        own work, not the time the caller spends between steps.
+        """
+        rng = np.random.default_rng(seed)
+        settings = (temperature, top_k, top_p, min_p)
+        pipeline = build_pipeline(temperature=temperature, top_k=top_k, top_p=top_p, min_p=min_p)
+        probs = np.empty(self.model.vocab_size)
+        context = list(prefix)
+        elapsed = 0.0
+
+        for index in range(max_new_tokens):
+            start = time.perf_counter()
+            distribution = self._distribution(context, settings, pipeline, probs)
+            cumulative = distribution.cumulative
+            i = int(min(np.searchsorted(cumulative, rng.random() * cumulative[-1], side="right"), len(cumulative) - 1))
+            token = int(distribution.tokens[i])
+            context.append(token)
+            elapsed += time.perf_counter() - start
+
+            yield GenerationStep(
+                index=index,
+                token=token,
+                probability=distribution.probability(i),
+                top_tokens=distribution.top_tokens,
+                top_probabilities=distribution.top_probabilities,
+                elapsed=elapsed
+            )
+            if token in stop_tokens:
+                break
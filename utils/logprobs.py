@@ -0,0 +1,385 @@
+"""
+Top-k next-token log probabilities for arbitrary prompts.
+
+Providers:
+
+- OfflineProvider answers from the local n-gram stand-in model and needs no
+  network.
+- OpenAIProvider calls any OpenAI-compatible chat completions endpoint.
+  That includes the bundled stand-in server, which serves the offline
+  model over HTTP:
+
+      python -m utils.logprobs serve --port 8765
+      LLM_EXPLORER_LOGPROBS_URL=http://127.0.0.1:8765/v1 streamlit run app.py
+
+get_provider() picks OpenAIProvider when LLM_EXPLORER_LOGPROBS_URL or
+OPENAI_API_KEY is set, and OfflineProvider otherwise.
+
+fetch() takes a batch of requests, drops duplicates, answers what it can
+from an on-disk LRU cache shared by all sessions and processes, and runs
+the rest concurrently on the provider's event loop. A request already in
+flight for another caller is awaited instead of being sent twice.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import Future
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import numpy as np
+
+from utils.generation import CORPUS_PATH, NGramModel
+from utils.sampling import logsumexp, top_k_indices
+from utils.tokenizers import encoding_for_model
+
+LOGPROBS_CACHE_PATH = Path(__file__).resolve().parent.parent / "cache" / "logprobs.sqlite"
+
+DEFAULT_MODEL = "gpt-4o-mini"
+
+
+@dataclass(frozen=True)
+class LogprobRequest:
+    prompt: str
+    model: str = DEFAULT_MODEL
+    top_logprobs: int = 10
+
+
+@dataclass
+class TopLogprobs:
+    tokens: list
+    logprobs: list
+
+    @property
+    def probabilities(self) -> np.ndarray:
+        """The top-k probabilities, renormalized to sum to 1."""
+        probs = np.exp(np.asarray(self.logprobs, dtype=np.float64))
+        return probs / probs.sum()
+
+
+class DiskCache:
+    """
+    LRU cache of TopLogprobs in a SQLite file. Entries past max_entries are
+    evicted least recently used first.
+    """
+
+    def __init__(self, path=LOGPROBS_CACHE_PATH, max_entries: int = 100_000):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock, self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS logprobs (key TEXT PRIMARY KEY, value TEXT, last_used REAL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS logprobs_last_used ON logprobs (last_used)")
+
+    def get_many(self, keys) -> dict:
+        keys = list(keys)
+        if not keys:
+            return {}
+        marks = ",".join("?" * len(keys))
+        with self._lock, self._db:
+            rows = self._db.execute(f"SELECT key, value FROM logprobs WHERE key IN ({marks})", keys).fetchall()
+            self._db.execute(f"UPDATE logprobs SET last_used = ? WHERE key IN ({marks})", [time.time()] + keys)
+        return {key: TopLogprobs(**json.loads(value)) for key, value in rows}
+
+    def put_many(self, items: dict):
+        now = time.time()
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO logprobs VALUES (?, ?, ?)",
+                [(key, json.dumps({"tokens": v.tokens, "logprobs": v.logprobs}), now) for key, v in items.items()]
+            )
+            self._db.execute(
+                "DELETE FROM logprobs WHERE key IN "
+                "(SELECT key FROM logprobs ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM logprobs").fetchone()[0]
+
+
+class LogprobError(RuntimeError):
+    """A provider could not answer a request: network, HTTP or tokenizer failures."""
+
+
+class LogprobProvider(ABC):
+    """
+    Base class of the providers. Subclasses set name and implement
+    _fetch_one(request), a coroutine returning TopLogprobs. fetch() raises
+    LogprobError for any failure of _fetch_one.
+
+    Coroutines run on one event loop in a background thread, owned by the
+    provider, so connections can be pooled across fetch() calls from any
+    thread.
+    """
+
+    name = "provider"
+
+    def __init__(self, cache: DiskCache = None, max_concurrency: int = 8, timeout: float = 60.0):
+        self.cache = cache
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self._loop = None
+        self._lock = threading.Lock()
+        self._in_flight = {}
+
+    def key(self, request: LogprobRequest) -> str:
+        return hashlib.sha256(
+            json.dumps([self.name, request.model, request.prompt, request.top_logprobs]).encode()
+        ).hexdigest()
+
+    def _event_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, daemon=True, name=f"{self.name}-logprobs").start()
+            return self._loop
+
+    @abstractmethod
+    async def _fetch_one(self, request: LogprobRequest) -> TopLogprobs:
+        ...
+
+    async def _fetch_many(self, requests):
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def limited(request):
+            async with semaphore:
+                return await self._fetch_one(request)
+
+        return await asyncio.gather(*(limited(r) for r in requests))
+
+    def fetch(self, requests) -> list:
+        """Returns the TopLogprobs of every request, in order."""
+        requests = list(requests)
+        keys = [self.key(r) for r in requests]
+        unique = dict(zip(keys, requests))
+        results = self.cache.get_many(unique) if self.cache is not None else {}
+
+        waiting, owned = {}, {}
+        with self._lock:
+            for key, request in unique.items():
+                if key in results:
+                    continue
+                if key in self._in_flight:
+                    waiting[key] = self._in_flight[key]
+                else:
+                    owned[key] = self._in_flight[key] = Future()
+
+        if owned:
+            try:
+                fetched = asyncio.run_coroutine_threadsafe(
+                    self._fetch_many([unique[k] for k in owned]), self._event_loop()
+                ).result(self.timeout)
+                fetched = dict(zip(owned, fetched))
+                if self.cache is not None:
+                    self.cache.put_many(fetched)
+                for key, future in owned.items():
+                    future.set_result(fetched[key])
+                results.update(fetched)
+            except Exception as e:
+                error = LogprobError(f"{self.name}: {type(e).__name__}: {e}")
+                error.__cause__ = e
+                for future in owned.values():
+                    future.set_exception(error)
+                raise error
+            except BaseException as e:
+                for future in owned.values():
+                    future.set_exception(e)
+                raise
+            finally:
+                with self._lock:
+                    for key in owned:
+                        del self._in_flight[key]
+
+        for key, future in waiting.items():
+            try:
+                results[key] = future.result(self.timeout)
+            except TimeoutError as e:
+                raise LogprobError(f"{self.name}: timed out waiting for a request in flight") from e
+        return [results[k] for k in keys]
+
+    def close(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+class OfflineProvider(LogprobProvider):
+    """Top-k log probabilities from the local n-gram stand-in model."""
+
+    name = "offline"
+
+    def __init__(self, model=None, enc=None, **kwargs):
+        super().__init__(**kwargs)
+        self._model = model
+        self._enc = enc
+        self._model_lock = threading.Lock()
+
+    def _load(self):
+        # Built on first use; the offline model is small but not free
+        with self._model_lock:
+            if self._enc is None:
+                self._enc = encoding_for_model("gpt-4o")
+            if self._model is None:
+                with open(CORPUS_PATH, "r") as f:
+                    self._model = NGramModel.from_text(f.read(), self._enc)
+        return self._model, self._enc
+
+    def compute(self, request: LogprobRequest) -> TopLogprobs:
+        model, enc = self._load()
+        logits = model.logits([enc.encode(request.prompt, disallowed_special=())])
+        ids, values = top_k_indices(logits - logsumexp(logits, axis=1, keepdims=True), request.top_logprobs)
+        return TopLogprobs(
+            tokens=[enc.decode([t]) for t in ids[0].tolist()],
+            logprobs=values[0].tolist()
+        )
+
+    async def _fetch_one(self, request: LogprobRequest) -> TopLogprobs:
+        # In a worker thread, so concurrent requests don't block the event loop
+        return await asyncio.get_running_loop().run_in_executor(None, self.compute, request)
+
+
+class OpenAIProvider(LogprobProvider):
+    """
+    Top-k log probabilities of the first token of a chat completion, from an
+    OpenAI-compatible endpoint. Requests share one pooled HTTP client.
+    """
+
+    name = "openai"
+
+    def __init__(self, base_url: str = "https://api.openai.com/v1", api_key: str = None,
+                 max_connections: int = 8, retries: int = 3, **kwargs):
+        kwargs.setdefault("max_concurrency", max_connections)
+        super().__init__(**kwargs)
+        self.name = base_url
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.max_connections = max_connections
+        self.retries = retries
+        self._client = None
+
+    def _http_client(self):
+        # Created on the provider's event loop, which it is bound to
+        if self._client is None:
+            # Only the HTTP providers need httpx
+            import httpx
+
+            headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=headers,
+                limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections),
+                timeout=self.timeout
+            )
+        return self._client
+
+    async def _fetch_one(self, request: LogprobRequest) -> TopLogprobs:
+        body = {
+            "model": request.model,
+            "messages": [{"role": "user", "content": request.prompt}],
+            "max_tokens": 1,
+            "logprobs": True,
+            "top_logprobs": request.top_logprobs,
+        }
+        for attempt in range(self.retries):
+            response = await self._http_client().post("/chat/completions", json=body)
+            # Back off on rate limits and server errors
+            if (response.status_code != 429 and response.status_code < 500) or attempt == self.retries - 1:
+                break
+            await asyncio.sleep(2 ** attempt)
+        response.raise_for_status()
+
+        top = response.json()["choices"][0]["logprobs"]["content"][0]["top_logprobs"]
+        return TopLogprobs(tokens=[t["token"] for t in top], logprobs=[t["logprob"] for t in top])
+
+    def close(self):
+        if self._client is not None and self._loop is not None:
+            asyncio.run_coroutine_threadsafe(self._client.aclose(), self._loop).result(self.timeout)
+        super().close()
+
+
+def get_provider(cache: DiskCache = None) -> LogprobProvider:
+    """The provider configured by the environment, with the disk cache unless another is given."""
+    cache = cache if cache is not None else DiskCache()
+    url = os.environ.get("LLM_EXPLORER_LOGPROBS_URL")
+    if url:
+        return OpenAIProvider(url, api_key=os.environ.get("OPENAI_API_KEY"), cache=cache)
+    if os.environ.get("OPENAI_API_KEY"):
+        return OpenAIProvider(api_key=os.environ["OPENAI_API_KEY"], cache=cache)
+    return OfflineProvider(cache=cache)
+
+
+def serve(port: int = 8765, provider: OfflineProvider = None):
+    """
+    Serves POST /v1/chat/completions in the OpenAI response format, backed by
+    the offline model, so OpenAIProvider can be run without network access.
+    """
+    provider = provider if provider is not None else OfflineProvider()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if self.path.rstrip("/") != "/v1/chat/completions":
+                self.send_error(404)
+                return
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            request = LogprobRequest(
+                prompt=body["messages"][-1]["content"],
+                model=body.get("model", DEFAULT_MODEL),
+                top_logprobs=body.get("top_logprobs") or 1
+            )
+            top = provider.compute(request)
+            entries = [{"token": t, "logprob": l, "bytes": list(t.encode())} for t, l in zip(top.tokens, top.logprobs)]
+            payload = json.dumps({
+                "object": "chat.completion",
+                "model": request.model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": top.tokens[0]},
+                    "logprobs": {"content": [dict(entries[0], top_logprobs=entries)]},
+                    "finish_reason": "length"
+                }]
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    print(f"Serving logprobs on http://127.0.0.1:{port}/v1")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Logprob providers.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve_parser = commands.add_parser("serve", help="run the local stand-in server")
+    serve_parser.add_argument("--port", type=int, default=8765)
+    fetch_parser = commands.add_parser("fetch", help="print the top logprobs of prompts")
+    fetch_parser.add_argument("prompts", nargs="+")
+    fetch_parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        serve(args.port)
+    else:
+        provider = get_provider()
+        for prompt, top in zip(args.prompts, provider.fetch([LogprobRequest(p, top_logprobs=args.top) for p in args.prompts])):
+            print(prompt)
+            for token, logprob in zip(top.tokens, top.logprobs):
+                print(f"  {token!r:20s} {logprob:8.3f}")
@@ -1,17 +1,95 @@
-import matplotlib.pyplot as plt
+import io
+import threading
+from collections import OrderedDict
+
+import numpy as np
 import streamlit as st
+from matplotlib.figure import Figure
+
+from utils.profiling import section, timed
+
+# Rendered PNGs, keyed on the chart and its (rounded) bar heights. Slider
+# moves that land on an already drawn distribution skip matplotlib entirely.
+_RENDER_CACHE_SIZE = 512
+_rendered = OrderedDict()
+
+# One persistent figure per chart layout; a cache miss only updates the bar
+# heights and re-rasterizes. matplotlib is not thread-safe and sessions run
+# in separate threads, so all drawing happens under one lock.
+_FIGURE_CACHE_SIZE = 32
+_figures = OrderedDict()
+_lock = threading.Lock()
+
+# Same settings st.pyplot uses by default.
+_SAVEFIG_KWARGS = {"format": "png", "bbox_inches": "tight", "dpi": 200}
+
+
+def _rounded(values):
+    # Differences below this are invisible at the chart's size
+    return None if values is None else np.round(np.asarray(values, dtype=np.float64), 4).tobytes()
+
+
+def _render(key, layout, build, update):
+    """Returns the PNG for key, drawing it on the layout's persistent figure on a miss."""
+    with _lock:
+        png = _rendered.get(key)
+        if png is not None:
+            _rendered.move_to_end(key)
+            return png
+
+        if layout in _figures:
+            _figures.move_to_end(layout)
+        else:
+            _figures[layout] = build()
+            if len(_figures) > _FIGURE_CACHE_SIZE:
+                _figures.popitem(last=False)
+        fig, artists = _figures[layout]
+        update(artists)
+
+        buffer = io.BytesIO()
+        with section("savefig"):
+            fig.savefig(buffer, **_SAVEFIG_KWARGS)
+        png = buffer.getvalue()
 
+        _rendered[key] = png
+        if len(_rendered) > _RENDER_CACHE_SIZE:
+            _rendered.popitem(last=False)
+        return png
+
+
+def _set_heights(bars, heights):
+    for bar, height in zip(bars, heights):
+        bar.set_height(height)
+
+
+@timed()
 def plot_distribution(probs, vocab, title = ""):
-    fig, ax = plt.subplots(figsize=(8, 4))
-    ax.bar(range(len(probs)), probs, tick_label=vocab, alpha=0.7, color="skyblue", edgecolor="black")
-    ax.set_ylim(0, 1)
-    ax.set_title(title)
-    ax.set_xlabel("Token")
-    ax.set_ylabel("Probability")
+    def build():
+        fig = Figure(figsize=(8, 4))
+        ax = fig.subplots()
+        bars = ax.bar(range(len(vocab)), np.zeros(len(vocab)), alpha=0.7, color="skyblue", edgecolor="black")
+        ax.set_ylim(0, 1)
+        ax.set_xlabel("Token")
+        ax.set_ylabel("Probability")
+        return fig, (ax, bars)
+
+    def update(artists):
+        # Labels are set on every draw, so one figure serves any vocabulary of this size
+        ax, bars = artists
+        ax.set_xticks(range(len(vocab)), vocab)
+        ax.set_title(title)
+        _set_heights(bars, probs)
 
-    st.pyplot(fig)
-    plt.close(fig)
+    layout = ("distribution", len(vocab))
+    png = _render(
+        layout + (tuple(vocab), title, _rounded(probs)),
+        layout,
+        build,
+        update
+    )
+    st.image(png, width="stretch")
 
+@timed()
 def plot_bar_chart_probability_distribution(
     probabilities,
     modified_probabilities,
@@ -20,31 +98,50 @@ def plot_bar_chart_probability_distribution(
     xlabel = "Token",
     ylabel = "Probability"
 ):
-    fig_combined, ax_combined = plt.subplots(figsize=(8, 4))
-    ax_combined.bar(
-        vocab,
-        probabilities,
-        color='none',
-        label='Initial Distribution',
-        edgecolor='black',
-        linestyle='--'
-    )
+    has_modified = modified_probabilities is not None
 
-    if modified_probabilities is not None:
-        ax_combined.bar(
+    def build():
+        fig_combined = Figure(figsize=(8, 4))
+        ax_combined = fig_combined.subplots()
+        initial_bars = ax_combined.bar(
             vocab,
-            modified_probabilities,
-            color='skyblue',
+            np.zeros(len(vocab)),
+            color='none',
+            label='Initial Distribution',
             edgecolor='black',
-            label='Modified Distribution',
-            alpha=0.7
+            linestyle='--'
         )
 
-    ax_combined.set_xlabel(xlabel)
-    ax_combined.set_ylabel(ylabel)
-    ax_combined.set_title(title)
-    ax_combined.tick_params(axis='x', rotation=45)
-    ax_combined.legend(loc='upper right')
-    ax_combined.set_ylim(0, 1) # Set y-axis limits from 0 to 1
-    st.pyplot(fig_combined)
-    plt.close(fig_combined) # Close the plot to free up memory
\ No newline at end of file
+        modified_bars = None
+        if has_modified:
+            modified_bars = ax_combined.bar(
+                vocab,
+                np.zeros(len(vocab)),
+                color='skyblue',
+                edgecolor='black',
+                label='Modified Distribution',
+                alpha=0.7
+            )
+
+        ax_combined.set_xlabel(xlabel)
+        ax_combined.set_ylabel(ylabel)
+        ax_combined.set_title(title)
+        ax_combined.tick_params(axis='x', rotation=45)
+        ax_combined.legend(loc='upper right')
+        ax_combined.set_ylim(0, 1) # Set y-axis limits from 0 to 1
+        return fig_combined, (initial_bars, modified_bars)
+
+    def update(artists):
+        initial_bars, modified_bars = artists
+        _set_heights(initial_bars, probabilities)
+        if has_modified:
+            _set_heights(modified_bars, modified_probabilities)
+
+    layout = ("comparison", tuple(vocab), title, xlabel, ylabel, has_modified)
+    png = _render(
+        layout + (_rounded(probabilities), _rounded(modified_probabilities)),
+        layout,
+        build,
+        update
+    )
+    st.image(png, width="stretch")
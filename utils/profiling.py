@@ -0,0 +1,275 @@
+"""
+Per-rerun timing instrumentation for the pages.
+
+Profiling is off unless the LLM_EXPLORER_PROFILE environment variable is
+set, and when it is off section() returns a shared no-op context manager
+and timed() returns the function unchanged, so instrumented code runs as
+before.
+
+    LLM_EXPLORER_PROFILE=1 streamlit run app.py
+    LLM_EXPLORER_PROFILE=memory,sample streamlit run app.py
+
+Any non-empty value records the wall time and the number of net allocated
+memory blocks of every section. "memory" additionally traces the peak
+memory of each rerun with tracemalloc, and "sample" runs a sampling
+profiler on the script thread.
+
+Every rerun is appended to PROFILE_LOG_PATH as one JSON line and shown in a
+"Profiling" panel in the sidebar. Summarize a log with
+
+    python -m utils.profiling [path]
+
+Block counts and peak memory are process-wide, so they include whatever
+other sessions were doing at the same time.
+"""
+import contextlib
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+
+PROFILE_FEATURES = {
+    feature.strip()
+    for feature in os.environ.get("LLM_EXPLORER_PROFILE", "").split(",")
+    if feature.strip() not in ("", "0")
+}
+ENABLED = bool(PROFILE_FEATURES)
+
+_APP_ROOT = str(Path(__file__).resolve().parent.parent)
+
+PROFILE_LOG_PATH = Path(os.environ.get("LLM_EXPLORER_PROFILE_LOG", Path(_APP_ROOT) / "logs" / "profile.jsonl"))
+
+SAMPLE_INTERVAL = 0.005
+
+# Reruns kept per session for the sidebar panel
+HISTORY_SIZE = 20
+
+_state = threading.local()
+_log_lock = threading.Lock()
+_NULL_SECTION = contextlib.nullcontext()
+
+if "memory" in PROFILE_FEATURES and not tracemalloc.is_tracing():
+    tracemalloc.start()
+
+
+class StackSampler:
+    """
+    Samples the call stack of one thread every interval seconds from a
+    background thread. stop() returns the number of samples in which each of
+    the app's own functions (pages and utils) was on the stack.
+    """
+
+    def __init__(self, thread_id: int, interval: float = SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            seen = set()
+            while frame is not None:
+                code = frame.f_code
+                if code.co_filename.startswith(_APP_ROOT):
+                    seen.add(f"{Path(code.co_filename).name}:{code.co_firstlineno} {code.co_name}")
+                frame = frame.f_back
+            self.counts.update(seen)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self) -> dict:
+        self._stop.set()
+        self._thread.join()
+        return dict(self.counts.most_common(20))
+
+
+# Called with the script thread's id; must return an object with start() and
+# stop() -> {function: samples}. Replace it to plug in another profiler.
+sampler_factory = StackSampler
+
+
+class _Rerun:
+    def __init__(self, page: str):
+        self.page = page
+        self.started = time.time()
+        self.start = time.perf_counter()
+        self.stack = []
+        self.sections = {}
+        self.sampler = None
+        if "sample" in PROFILE_FEATURES:
+            self.sampler = sampler_factory(threading.get_ident())
+            self.sampler.start()
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+
+    def add(self, name: str, seconds: float, blocks: int):
+        entry = self.sections.setdefault(name, {"calls": 0, "seconds": 0.0, "blocks": 0})
+        entry["calls"] += 1
+        entry["seconds"] += seconds
+        entry["blocks"] += blocks
+
+    def finish(self) -> dict:
+        record = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+            "page": self.page,
+            "seconds": time.perf_counter() - self.start,
+            "sections": self.sections,
+        }
+        if tracemalloc.is_tracing():
+            record["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+        if self.sampler is not None:
+            record["samples"] = self.sampler.stop()
+        return record
+
+
+class _Section:
+    __slots__ = ("name", "rerun", "start", "blocks")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.rerun = getattr(_state, "rerun", None)
+        if self.rerun is not None:
+            self.rerun.stack.append(self.name)
+            self.blocks = sys.getallocatedblocks()
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self.rerun is not None:
+            seconds = time.perf_counter() - self.start
+            # Nested sections are recorded under their full path, e.g. "encode/ChunkedTokenizer.encode"
+            name = "/".join(self.rerun.stack)
+            self.rerun.stack.pop()
+            self.rerun.add(name, seconds, sys.getallocatedblocks() - self.blocks)
+        return False
+
+
+def section(name: str):
+    """Context manager timing the code inside it as part of the current rerun."""
+    if not ENABLED:
+        return _NULL_SECTION
+    return _Section(name)
+
+
+def timed(name: str = None):
+    """
+    Decorator timing every call of a function as a section named after it.
+    Not meant for generators, which would only be timed until they are created.
+    """
+    def decorate(fn):
+        if not ENABLED:
+            return fn
+        label = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _Section(label):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def start_page(page: str):
+    """Starts recording a rerun of page. Call at the top of the page script."""
+    if not ENABLED:
+        return
+    # A rerun that ended early (st.rerun, st.stop) is still logged
+    previous = getattr(_state, "rerun", None)
+    if previous is not None:
+        _write(previous.finish())
+    _state.rerun = _Rerun(page)
+
+
+def end_page():
+    """
+    Finishes the current rerun, writes it to the log and shows the sidebar
+    panel. Call at the bottom of the page script.
+    """
+    rerun = getattr(_state, "rerun", None) if ENABLED else None
+    if rerun is None:
+        return
+    _state.rerun = None
+    record = rerun.finish()
+    _write(record)
+    _show(record)
+
+
+def _write(record: dict):
+    with _log_lock:
+        PROFILE_LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
+        with open(PROFILE_LOG_PATH, "a") as f:
+            f.write(json.dumps(record) + "\n")
+
+
+def _show(record: dict):
+    # Imported here so the utils modules that use timed() don't need streamlit
+    import streamlit as st
+
+    history = st.session_state.setdefault("_profiling_history", [])
+    history.append(record)
+    del history[:-HISTORY_SIZE]
+
+    with st.sidebar.expander("Profiling"):
+        caption = f"{record['page']}: {record['seconds'] * 1000:.1f} ms"
+        if "peak_bytes" in record:
+            caption += f" · peak {record['peak_bytes'] / 2**20:.1f} MiB"
+        st.caption(caption)
+
+        sections = sorted(record["sections"].items(), key=lambda item: item[0])
+        st.dataframe(
+            {
+                "Section": [name for name, _ in sections],
+                "Calls": [entry["calls"] for _, entry in sections],
+                "ms": [round(entry["seconds"] * 1000, 2) for _, entry in sections],
+                "Blocks": [entry["blocks"] for _, entry in sections],
+            },
+            hide_index=True
+        )
+        if "samples" in record:
+            st.dataframe(
+                {"Function": list(record["samples"]), "Samples": list(record["samples"].values())},
+                hide_index=True
+            )
+        st.line_chart({"Rerun ms": [r["seconds"] * 1000 for r in history]}, height=120)
+
+
+def summarize(path=PROFILE_LOG_PATH):
+    """
+    Aggregates a profile log into {(page, section): {"runs", "median_ms", "p95_ms"}},
+    with the whole rerun listed as section "(rerun)".
+    """
+    seconds = {}
+    with open(path) as f:
+        for line in f:
+            record = json.loads(line)
+            seconds.setdefault((record["page"], "(rerun)"), []).append(record["seconds"])
+            for name, entry in record["sections"].items():
+                seconds.setdefault((record["page"], name), []).append(entry["seconds"])
+
+    return {
+        key: {
+            "runs": len(values),
+            "median_ms": float(np.median(values)) * 1000,
+            "p95_ms": float(np.percentile(values, 95)) * 1000,
+        }
+        for key, values in sorted(seconds.items())
+    }
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else PROFILE_LOG_PATH
+    print(f"{'page':20s} {'section':50s} {'runs':>6s} {'median ms':>10s} {'p95 ms':>10s}")
+    for (page, name), stats in summarize(path).items():
+        print(f"{page:20s} {name:50s} {stats['runs']:6d} {stats['median_ms']:10.2f} {stats['p95_ms']:10.2f}")
@@ -0,0 +1,146 @@
+from pathlib import Path
+
+import numpy as np
+
+from utils.embeddings import EMBEDDING_STORE_DIR, EmbeddingStore
+from utils.profiling import timed
+
+PROJECTION_DIR = EMBEDDING_STORE_DIR / "projection"
+
+_BLOCK_ROWS = 16384
+
+
+def _blocks(store: EmbeddingStore):
+    """Yields (start, float32 block) pairs, dequantizing one block at a time."""
+    for start in range(0, len(store), _BLOCK_ROWS):
+        rows = np.arange(start, min(start + _BLOCK_ROWS, len(store)))
+        yield start, store.get_rows(rows)
+
+
+def fit_pca(store: EmbeddingStore, n_components: int = 2):
+    """
+    Fits PCA in one streaming pass over the store, accumulating the mean and
+    the (dim, dim) scatter matrix block by block.
+    Returns (mean, components) with components shaped (dim, n_components).
+    """
+    total = np.zeros(store.dim)
+    scatter = np.zeros((store.dim, store.dim))
+    for _, block in _blocks(store):
+        block = block.astype(np.float64)
+        total += block.sum(axis=0)
+        scatter += block.T @ block
+
+    n = len(store)
+    mean = total / n
+    covariance = scatter / n - np.outer(mean, mean)
+    _, eigenvectors = np.linalg.eigh(covariance)
+    components = eigenvectors[:, ::-1][:, :n_components]
+    return mean.astype(np.float32), components.astype(np.float32)
+
+
+def random_projection(store: EmbeddingStore, n_components: int = 2, seed: int = 0):
+    """Gaussian random projection, as a cheaper alternative to fit_pca."""
+    rng = np.random.default_rng(seed)
+    components = rng.standard_normal((store.dim, n_components)) / np.sqrt(n_components)
+    return np.zeros(store.dim, dtype=np.float32), components.astype(np.float32)
+
+
+def build_projection(store: EmbeddingStore, path=PROJECTION_DIR, method: str = "pca",
+                     n_components: int = 2, grid_size: int = 64, seed: int = 0):
+    """
+    Projects every row of the store and saves the coordinates together with
+    a grid index over the first two dimensions.
+
+    Points are stored sorted by grid cell, and within a cell in a random
+    order, so the first n points of a cell are a uniform level-of-detail
+    sample of it.
+    """
+    if method == "pca":
+        mean, components = fit_pca(store, n_components)
+    elif method == "random":
+        mean, components = random_projection(store, n_components, seed)
+    else:
+        raise ValueError(f"Unknown projection method: {method}")
+
+    coords = np.empty((len(store), n_components), dtype=np.float32)
+    for start, block in _blocks(store):
+        coords[start:start + len(block)] = (block - mean) @ components
+
+    lo = coords[:, :2].min(axis=0)
+    hi = coords[:, :2].max(axis=0)
+    cells = _cell_of(coords[:, :2], lo, hi, grid_size)
+    priority = np.random.default_rng(seed).permutation(len(store))
+    order = np.lexsort((priority, cells))
+
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    np.save(path / "coords.npy", coords[order])
+    np.save(path / "token_ids.npy", store.token_ids[order])
+    np.save(path / "cell_start.npy", np.searchsorted(cells[order], np.arange(grid_size * grid_size + 1)))
+    np.save(path / "bounds.npy", np.stack([lo, hi]))
+
+
+def _cell_of(xy, lo, hi, grid_size):
+    span = np.where(hi > lo, hi - lo, 1.0)
+    cell = np.clip(((xy - lo) / span * grid_size).astype(np.int64), 0, grid_size - 1)
+    return cell[:, 1] * grid_size + cell[:, 0]
+
+
+class ProjectionTiles:
+    """
+    Reads a saved projection one viewport at a time. The coordinates are
+    memory-mapped, so only the grid cells overlapping the viewport are read.
+    """
+
+    def __init__(self, path=PROJECTION_DIR):
+        path = Path(path)
+        self.coords = np.load(path / "coords.npy", mmap_mode="r")
+        self.token_ids = np.load(path / "token_ids.npy", mmap_mode="r")
+        self.cell_start = np.load(path / "cell_start.npy")
+        self.lo, self.hi = np.load(path / "bounds.npy")
+        self.grid_size = int(round(np.sqrt(len(self.cell_start) - 1)))
+
+    @property
+    def bounds(self):
+        """(xmin, xmax, ymin, ymax) of all points."""
+        return float(self.lo[0]), float(self.hi[0]), float(self.lo[1]), float(self.hi[1])
+
+    @timed()
+    def query(self, xmin: float, xmax: float, ymin: float, ymax: float, max_points: int = 2000):
+        """
+        Returns (coords, token_ids) of at most max_points points inside the
+        viewport, taking an even share from every visible grid cell.
+        """
+        corners = np.array([[xmin, ymin], [xmax, ymax]], dtype=np.float32)
+        span = np.where(self.hi > self.lo, self.hi - self.lo, 1.0)
+        (cx0, cy0), (cx1, cy1) = np.clip(
+            ((corners - self.lo) / span * self.grid_size).astype(np.int64), 0, self.grid_size - 1
+        )
+        cells = (np.arange(cy0, cy1 + 1)[:, None] * self.grid_size + np.arange(cx0, cx1 + 1)).ravel()
+        starts = self.cell_start[cells]
+        counts = self.cell_start[cells + 1] - starts
+        occupied = counts > 0
+        starts, counts = starts[occupied], counts[occupied]
+        if len(starts) == 0:
+            return np.empty((0, self.coords.shape[1]), dtype=np.float32), np.empty(0, dtype=np.int64)
+
+        if len(starts) > max_points:
+            # More occupied cells than points to show: one point from a spread of cells
+            spread = np.linspace(0, len(starts) - 1, max_points).astype(np.int64)
+            starts, counts = starts[spread], counts[spread]
+
+        per_cell = max(1, max_points // len(starts))
+        take = np.minimum(counts, per_cell)
+        index = np.repeat(starts - np.cumsum(take) + take, take) + np.arange(take.sum())
+
+        coords = np.asarray(self.coords[index])
+        token_ids = np.asarray(self.token_ids[index])
+        inside = (
+            (coords[:, 0] >= xmin) & (coords[:, 0] <= xmax)
+            & (coords[:, 1] >= ymin) & (coords[:, 1] <= ymax)
+        )
+        return coords[inside], token_ids[inside]
+
+
+if __name__ == "__main__":
+    build_projection(EmbeddingStore())
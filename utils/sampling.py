@@ -1,51 +1,39 @@
+import hashlib
+from collections import OrderedDict
+
 import numpy as np
 
+from utils.profiling import timed
+
 def normalize_probabilities(probabilities):
     return probabilities / np.sum(probabilities)
 
+@timed()
 def scale_probabilities(probabilities, temperature):
-    # Apply temperature
-    scaled_probabilities = np.power(probabilities, 1 / temperature)
-    scaled_probabilities = scaled_probabilities / np.sum(scaled_probabilities)
-    return scaled_probabilities
+    # Apply temperature in log space, so low temperatures don't underflow
+    pipeline = LogitsPipeline([Temperature(temperature)])
+    return pipeline(log_probabilities(probabilities))
 
+@timed()
 def top_k_scaling(probs, k):
     """
     Given a 1D numpy array of probabilities,
     retains the k most probable tokens and sets the rest to zero.
     """
-    idx = np.arange(len(probs))
-    keep_idx = idx[:k]
-    out = np.zeros_like(probs)
-    out[keep_idx] = probs[keep_idx]
-    out = out / np.sum(out)
-    return out
+    indices, kept = batch_truncate(probs, top_k=k)
+    return _densify(indices, kept, len(probs))
 
+@timed()
 def top_p_scaling(probs, p):
     """
     Given a 1D numpy array of probabilities,
     retains the minimal number of highest-probability entries
     whose cumulative sum ≥ p, and renormalizes them.
-
-    probs is assumed to be a sorted array of probabilities.
     """
+    indices, kept = batch_truncate(probs, top_p=p)
+    return _densify(indices, kept, len(probs))
 
-    idx = np.arange(len(probs))
-
-    # Find cutoff
-    cumulative = np.cumsum(probs)
-    cutoff_idx = np.searchsorted(cumulative, p)
-
-    # Indices to keep
-    keep_idx = idx[:cutoff_idx + 1]
-
-    # Create output distribution
-    out = np.zeros_like(probs)
-    selected_probs = probs[keep_idx]
-    out[keep_idx] = selected_probs / selected_probs.sum()
-
-    return out
-
+@timed()
 def min_p_scaling(probs: np.ndarray, p: float):
     """
     Takes a 1D numpy array of probabilities and applies minimum-p scaling.
@@ -67,12 +55,487 @@ def min_p_scaling(probs: np.ndarray, p: float):
     return filtered / total
 
 
+@timed()
 def sample_next_word(probabilities, candidate_words, k=1):
-    sampled_words = np.random.choice(candidate_words, size=k, p=probabilities)
-    return sampled_words
+    ids = _default_sampler.draw(probabilities, size=k)
+    return np.asarray(candidate_words)[ids]
 
+@timed()
 def samples_to_probability_distribution(sampled_words, candidate_words):
-    probability_distribution = np.zeros(len(candidate_words))
-    for word in sampled_words:
-        probability_distribution[candidate_words.index(word)] += 1
-    return probability_distribution / np.sum(probability_distribution)
+    candidates = np.asarray(candidate_words)
+    order = np.argsort(candidates)
+    sampled = np.asarray(sampled_words)
+    # searchsorted gives the insertion point, so check that it holds the word
+    positions = np.clip(np.searchsorted(candidates[order], sampled), 0, max(len(candidates) - 1, 0))
+    found = candidates[order][positions] == sampled if len(candidates) else np.zeros(sampled.shape, dtype=bool)
+    if not np.all(found):
+        raise ValueError(f"{sampled[~found][0].item()!r} is not in candidate_words")
+    ids = order[positions]
+    return ids_to_probability_distribution(ids, len(candidates))
+
+
+# --- Batched engine ---------------------------------------------------------
+#
+# The functions above work on one small 1D distribution, which is all the
+# Sampling page needs. The functions below take a (batch, vocab) matrix of
+# unsorted logits or probabilities, so they can be used with a full model
+# vocabulary (100k-200k tokens) and many rows at once.
+
+_INITIAL_CANDIDATES = 64
+# Once the candidate set grows past this fraction of the vocabulary, one full
+# sort is cheaper than another round of partial selection
+_FULL_SORT_FRACTION = 1 / 1024
+
+
+def top_k_indices(scores: np.ndarray, k: int):
+    """
+    Given a (batch, vocab) array of scores, returns the indices and values of
+    the k largest entries per row, sorted descending.
+
+    Uses partial selection (np.argpartition), so the cost is O(vocab) plus a
+    sort of the k selected entries. Ties are broken by the lower index.
+    """
+    scores = np.atleast_2d(scores)
+    vocab = scores.shape[1]
+    k = max(1, min(int(k), vocab))
+
+    if k < vocab:
+        # argpartition is slow when most of a row is one repeated value (e.g.
+        # -inf after masking, or zeros), unless those values sort last.
+        floor = scores.min(axis=1, keepdims=True)
+        if np.count_nonzero(scores == floor) * 2 > scores.size:
+            idx = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            idx = np.argpartition(scores, vocab - k, axis=1)[:, vocab - k:]
+        vals = np.take_along_axis(scores, idx, axis=1)
+
+        # argpartition picks arbitrary members among ties at the boundary;
+        # redo the selection for the (rare) rows where that matters.
+        threshold = vals.min(axis=1, keepdims=True)
+        tied_rows = np.flatnonzero(np.count_nonzero(scores >= threshold, axis=1) > k)
+        for row in tied_rows:
+            above = np.flatnonzero(scores[row] > threshold[row])
+            equal = np.flatnonzero(scores[row] == threshold[row])
+            idx[row] = np.concatenate([above, equal[:k - len(above)]])
+        if len(tied_rows):
+            vals = np.take_along_axis(scores, idx, axis=1)
+    else:
+        idx = np.argsort(-scores, axis=1)
+        vals = np.take_along_axis(scores, idx, axis=1)
+        # Ties must stay in index order, which only a (much slower) stable
+        # sort guarantees; redo it for the rows that have ties.
+        for row in np.flatnonzero(np.any(vals[:, 1:] == vals[:, :-1], axis=1)):
+            idx[row] = np.argsort(-scores[row], kind="stable")
+            vals[row] = scores[row, idx[row]]
+        return idx, vals
+
+    order = np.lexsort((idx, -vals), axis=1)
+    idx = np.take_along_axis(idx, order, axis=1)
+    vals = np.take_along_axis(vals, order, axis=1)
+    return idx, vals
+
+
+def _keep_mask(probs, top_p, min_p, exhausted):
+    """
+    Given (batch, m) probabilities sorted descending, returns the mask of
+    entries kept by top-p and min-p, and whether every row's cutoff is known
+    from these m candidates alone.
+    """
+    keep = np.ones(probs.shape, dtype=bool)
+    done = np.full(probs.shape[0], exhausted)
+
+    if top_p is not None:
+        cumulative = np.cumsum(probs, axis=1)
+        preceding = np.zeros_like(cumulative)
+        preceding[:, 1:] = cumulative[:, :-1]
+        keep &= preceding < top_p
+        # The most probable token is always kept, even for top_p=0
+        keep[:, 0] = True
+        done |= cumulative[:, -1] >= top_p
+
+    if min_p is not None:
+        threshold = probs[:, :1] * min_p
+        keep &= probs >= threshold
+        done |= probs[:, -1] < threshold[:, 0]
+
+    return keep, bool(done.all())
+
+
+@timed()
+def batch_truncate(scores, top_k=None, top_p=None, min_p=None, from_logits=False):
+    """
+    Applies top-k, top-p and min-p truncation to a (batch, vocab) array of
+    unsorted logits (from_logits=True) or probabilities.
+
+    Returns (indices, probs), both (batch, m) with rows sorted by descending
+    probability. probs is renormalized over the kept tokens and is zero for
+    the padding slots of rows that keep fewer than m tokens.
+
+    Top-p is applied to the distribution renormalized over the top-k tokens,
+    min-p is relative to the most probable token.
+    """
+    scores = np.atleast_2d(np.asarray(scores, dtype=np.float64))
+    vocab = scores.shape[1]
+    width = vocab if top_k is None else max(1, min(int(top_k), vocab))
+
+    if top_k is not None or (top_p is None and min_p is None):
+        m = width
+    else:
+        # Top-p/min-p usually cut off after a handful of tokens, so look at a
+        # small candidate set first and only widen it for rows that need it.
+        m = min(width, _INITIAL_CANDIDATES)
+
+    if from_logits and top_k is None:
+        row_max = scores.max(axis=1, keepdims=True)
+        log_norm = row_max + np.log(np.exp(scores - row_max).sum(axis=1, keepdims=True))
+    elif not from_logits and top_k is None:
+        total = scores.sum(axis=1, keepdims=True)
+
+    while True:
+        idx, vals = top_k_indices(scores, m)
+        if from_logits:
+            if top_k is None:
+                probs = np.exp(vals - log_norm)
+            else:
+                probs = np.exp(vals - vals[:, :1])
+                probs /= probs.sum(axis=1, keepdims=True)
+        else:
+            probs = vals / (total if top_k is None else vals.sum(axis=1, keepdims=True))
+
+        keep, done = _keep_mask(probs, top_p, min_p, m == width)
+        if done:
+            break
+        m = min(width, m * 4)
+        if m > width * _FULL_SORT_FRACTION:
+            m = width
+
+    probs = np.where(keep, probs, 0.0)
+    probs /= probs.sum(axis=1, keepdims=True)
+
+    # Drop the trailing columns that no row kept.
+    m = int(keep.sum(axis=1).max())
+    return idx[:, :m], probs[:, :m]
+
+
+@timed()
+def batch_sample(indices, probs, rng=None):
+    """
+    Draws one token per row from the output of batch_truncate.
+    Returns a (batch,) array of token indices.
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    cumulative = np.cumsum(probs, axis=1)
+    u = rng.random((probs.shape[0], 1)) * cumulative[:, -1:]
+    choice = np.minimum((cumulative <= u).sum(axis=1), probs.shape[1] - 1)
+    return indices[np.arange(probs.shape[0]), choice]
+
+
+def _densify(indices, probs, vocab):
+    out = np.zeros(vocab)
+    out[indices[0]] = probs[0]
+    return out
+
+
+# --- Log-space processor pipeline -------------------------------------------
+#
+# Each processor edits a (batch, vocab) array of logits in place, masking
+# removed tokens with -inf. LogitsPipeline runs a chain of them over a buffer
+# that can be reused across calls and normalizes once at the end, so e.g.
+# T=0.01 no longer underflows the way np.power(probs, 1 / T) does.
+
+def logsumexp(logits, axis=-1, keepdims=False):
+    """
+    Numerically stable log(sum(exp(logits))) along an axis.
+    Rows that are entirely -inf give -inf.
+    """
+    row_max = np.max(logits, axis=axis, keepdims=True)
+    row_max = np.where(np.isfinite(row_max), row_max, 0.0)
+    with np.errstate(divide="ignore"):
+        out = np.log(np.sum(np.exp(logits - row_max), axis=axis, keepdims=True)) + row_max
+    return out if keepdims else np.squeeze(out, axis=axis)
+
+
+def log_probabilities(probs, out=None):
+    """Converts probabilities to logits, mapping zeros to -inf."""
+    with np.errstate(divide="ignore"):
+        return np.log(probs, out=out)
+
+
+class Temperature:
+    def __init__(self, temperature: float):
+        self.temperature = temperature
+
+    def __call__(self, logits, mask):
+        np.multiply(logits, 1 / self.temperature, out=logits)
+
+
+class TopK:
+    def __init__(self, k: int):
+        self.k = k
+
+    def __call__(self, logits, mask):
+        if self.k >= logits.shape[1]:
+            return
+        idx, _ = top_k_indices(logits, self.k)
+        # Mask by position, not by value, so ties at the k-th value don't
+        # keep more than k tokens
+        mask.fill(True)
+        np.put_along_axis(mask, idx, False, axis=1)
+        logits[mask] = -np.inf
+
+
+class TopP:
+    def __init__(self, p: float):
+        self.p = p
+
+    def __call__(self, logits, mask):
+        if self.p >= 1.0:
+            return
+        candidates, columns = _alive(logits, mask)
+        idx, probs = batch_truncate(candidates, top_p=self.p, from_logits=True)
+        if columns is not None:
+            idx = np.take_along_axis(columns, idx, axis=1)
+        # Padding slots of rows that keep fewer tokens repeat the top token
+        idx = np.where(probs > 0, idx, idx[:, :1])
+        mask.fill(True)
+        np.put_along_axis(mask, idx, False, axis=1)
+        logits[mask] = -np.inf
+
+
+def _alive(logits, mask):
+    """
+    Returns the logits that are not yet masked, as a (batch, n) array padded
+    with -inf, and the (batch, n) columns they came from, or None if the
+    logits are returned as they are.
+
+    Selection on a row that is mostly -inf is slow (argpartition degrades on
+    duplicates), so after e.g. top-k the later processors work on the
+    survivors only.
+    """
+    np.isfinite(logits, out=mask)
+    counts = np.count_nonzero(mask, axis=1)
+    n = int(counts.max())
+    if 2 * n > logits.shape[1]:
+        return logits, None
+
+    rows, cols = np.nonzero(mask)
+    pos = np.arange(len(cols)) - np.repeat(np.cumsum(counts) - counts, counts)
+    candidates = np.full((len(logits), n), -np.inf)
+    candidates[rows, pos] = logits[rows, cols]
+    # Padding slots hold -inf, so they are never kept
+    columns = np.zeros((len(logits), n), dtype=np.intp)
+    columns[rows, pos] = cols
+    return candidates, columns
+
+
+class MinP:
+    def __init__(self, p: float):
+        self.p = p
+
+    def __call__(self, logits, mask):
+        if self.p <= 0.0:
+            return
+        threshold = logits.max(axis=1, keepdims=True) + np.log(self.p)
+        np.less(logits, threshold, out=mask)
+        logits[mask] = -np.inf
+
+
+class LogitsPipeline:
+    """
+    Applies a chain of processors (Temperature, TopK, TopP, MinP, or any
+    callable taking (logits, mask)) and returns normalized probabilities.
+
+    Pass out= to write the result into an existing float64 array of the same
+    shape as the input; otherwise a new array is returned. The boolean mask
+    buffer handed to the processors is kept between calls.
+    """
+
+    def __init__(self, processors):
+        self.processors = list(processors)
+        self._mask = None
+
+    def _work(self, logits, out):
+        logits = np.asarray(logits)
+        if out is None:
+            out = np.empty(logits.shape, dtype=np.float64)
+        work = out.reshape(np.atleast_2d(logits).shape)
+        np.copyto(work, np.atleast_2d(logits))
+
+        if self._mask is None or self._mask.shape != work.shape:
+            self._mask = np.empty(work.shape, dtype=bool)
+        for processor in self.processors:
+            processor(work, self._mask)
+        return out, work
+
+    def log_probs(self, logits, out=None):
+        """Same as calling the pipeline, but returns normalized log-probabilities."""
+        out, work = self._work(logits, out)
+        work -= logsumexp(work, axis=1, keepdims=True)
+        return out
+
+    @timed("LogitsPipeline")
+    def __call__(self, logits, out=None):
+        out, work = self._work(logits, out)
+        work -= work.max(axis=1, keepdims=True)
+        np.exp(work, out=work)
+        work /= work.sum(axis=1, keepdims=True)
+        return out
+
+
+def build_pipeline(temperature=None, top_k=None, top_p=None, min_p=None):
+    """
+    Builds a LogitsPipeline applying the given settings in the order
+    temperature -> top-k -> top-p -> min-p. Settings left as None are skipped.
+    """
+    processors = []
+    if temperature is not None:
+        processors.append(Temperature(temperature))
+    if top_k is not None:
+        processors.append(TopK(top_k))
+    if top_p is not None:
+        processors.append(TopP(top_p))
+    if min_p is not None:
+        processors.append(MinP(min_p))
+    return LogitsPipeline(processors)
+
+
+# --- Alias sampling ---------------------------------------------------------
+#
+# Walker's alias method: after an O(vocab) setup, every draw is one uniform
+# number and one table lookup. Tables are cached per distribution, so
+# repeated draws from the same distribution only pay for the draws.
+
+def build_alias_table(probs):
+    """
+    Given a 1D numpy array of (unnormalized) probabilities, returns the
+    (prob, alias) arrays of the alias table.
+
+    Small columns are paired with large ones in vectorized rounds: every
+    small column is assigned to the large column whose surplus its deficit
+    starts in, and large columns pushed below 1 become small for the next
+    round.
+    """
+    probs = np.asarray(probs, dtype=np.float64)
+    n = len(probs)
+    q = probs * (n / probs.sum())
+    prob = np.ones(n)
+    alias = np.arange(n)
+
+    small = np.flatnonzero(q < 1.0)
+    large = np.flatnonzero(q >= 1.0)
+    while len(small) and len(large):
+        deficit = 1.0 - q[small]
+        start = np.cumsum(deficit) - deficit
+        surplus_end = np.cumsum(q[large] - 1.0)
+        owner = np.minimum(np.searchsorted(surplus_end, start, side="right"), len(large) - 1)
+
+        prob[small] = q[small]
+        alias[small] = large[owner]
+        q[large] -= np.bincount(owner, weights=deficit, minlength=len(large))
+
+        converted = q[large] < 1.0
+        small = large[converted]
+        large = large[~converted]
+
+    # Whatever is left over only differs from 1 by rounding error.
+    prob[small] = 1.0
+    return prob, alias
+
+
+class AliasSampler:
+    """
+    Draws token ids from probability distributions using cached alias
+    tables. Tables are keyed by a hash of the distribution and evicted
+    least-recently-used once more than maxsize are held.
+    """
+
+    def __init__(self, maxsize: int = 32, seed=None):
+        self.maxsize = maxsize
+        self.rng = np.random.default_rng(seed)
+        self._tables = OrderedDict()
+
+    def table(self, probs):
+        probs = np.ascontiguousarray(probs, dtype=np.float64)
+        key = hashlib.blake2b(probs.tobytes(), digest_size=16).digest()
+        if key in self._tables:
+            self._tables.move_to_end(key)
+            return self._tables[key]
+
+        table = build_alias_table(probs)
+        self._tables[key] = table
+        if len(self._tables) > self.maxsize:
+            self._tables.popitem(last=False)
+        return table
+
+    def draw(self, probs, size: int = 1):
+        """Returns a (size,) array of ids drawn from probs."""
+        prob, alias = self.table(probs)
+        u = self.rng.random(size) * len(prob)
+        column = u.astype(np.intp)
+        return np.where(u - column < prob[column], column, alias[column])
+
+
+_default_sampler = AliasSampler()
+
+
+def ids_to_probability_distribution(ids, vocab_size: int):
+    """Turns an array of drawn ids into an empirical distribution over vocab_size ids."""
+    counts = np.bincount(ids, minlength=vocab_size)
+    return counts / counts.sum()
+
+
+# --- Parameter grids --------------------------------------------------------
+#
+# The Sampling page's sliders move over fixed grids of values. These evaluate
+# a method for every value of its grid in one vectorized pass and return a
+# (grid, vocab) matrix, so a slider move is a row lookup.
+
+def _rank(probs):
+    """Rank of every entry by descending probability, ties by the lower index."""
+    order = np.argsort(-probs, kind="stable")
+    rank = np.empty(len(probs), dtype=np.int64)
+    rank[order] = np.arange(len(probs))
+    return order, rank
+
+
+def _normalize_rows(out):
+    totals = out.sum(axis=1, keepdims=True)
+    np.divide(out, totals, out=out, where=totals > 0)
+    return out
+
+
+@timed()
+def temperature_grid(probs, temperatures):
+    logits = log_probabilities(np.asarray(probs, dtype=np.float64))
+    scaled = logits[None, :] / np.asarray(temperatures, dtype=np.float64)[:, None]
+    return LogitsPipeline([])(scaled)
+
+
+@timed()
+def top_k_grid(probs, ks):
+    probs = np.asarray(probs, dtype=np.float64)
+    _, rank = _rank(probs)
+    keep = rank[None, :] < np.asarray(ks)[:, None]
+    return _normalize_rows(np.where(keep, probs, 0.0))
+
+
+@timed()
+def top_p_grid(probs, ps):
+    probs = np.asarray(probs, dtype=np.float64)
+    order, rank = _rank(probs)
+    cumulative = np.cumsum(probs[order])
+    preceding = np.concatenate([[0.0], cumulative[:-1]])[rank]
+    keep = preceding[None, :] < np.asarray(ps)[:, None]
+    return _normalize_rows(np.where(keep, probs, 0.0))
+
+
+@timed()
+def min_p_grid(probs, ps):
+    probs = np.asarray(probs, dtype=np.float64)
+    keep = probs[None, :] >= probs.max() * np.asarray(ps)[:, None]
+    return _normalize_rows(np.where(keep, probs, 0.0))
+
+
+def grid_index(grid, value) -> int:
+    """Index of the grid point closest to value."""
+    return int(np.abs(np.asarray(grid) - value).argmin())
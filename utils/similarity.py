@@ -0,0 +1,223 @@
+from pathlib import Path
+
+import numpy as np
+
+from utils.embeddings import EMBEDDING_STORE_DIR, EmbeddingStore, normalize_rows
+from utils.profiling import timed
+from utils.sampling import top_k_indices
+
+LSH_INDEX_DIR = EMBEDDING_STORE_DIR / "lsh"
+
+_BLOCK_ROWS = 16384
+# Smaller blocks for search, so the float32 copy of a block stays in cache
+_SEARCH_BLOCK_ROWS = 4096
+
+
+def _normalize(vectors):
+    return normalize_rows(np.atleast_2d(vectors))
+
+
+def _row_inverse_norms(store: EmbeddingStore):
+    """1 / norm of every stored (still quantized) row, computed block by block."""
+    inverse_norms = np.empty(len(store), dtype=np.float32)
+    for start in range(0, len(store), _BLOCK_ROWS):
+        block = np.asarray(store.matrix[start:start + _BLOCK_ROWS], dtype=np.float32)
+        norms = np.linalg.norm(block, axis=1)
+        norms[norms == 0] = 1.0
+        inverse_norms[start:start + _BLOCK_ROWS] = 1.0 / norms
+    return inverse_norms
+
+
+def _per_query(exclude, n_queries):
+    """
+    exclude is either one list of token ids for every query, or one list per
+    query. Returns one list per query (or None) and the longest list's length.
+    """
+    if exclude is None:
+        return None, 0
+    if len(exclude) == 0 or np.ndim(exclude[0]) == 0:
+        exclude = [exclude] * n_queries
+    return exclude, max(len(e) for e in exclude)
+
+
+def _drop_excluded(rows, scores, store, exclude, k):
+    """
+    Removes excluded token ids and unfilled slots (row -1) from over-fetched
+    results and keeps the top k. Columns that no query can fill are dropped;
+    the remaining unfilled slots have token id -1 and score -inf.
+    """
+    valid = rows >= 0
+    token_ids = np.where(valid, store.token_ids[np.where(valid, rows, 0)], -1)
+    keep = valid
+    if exclude is not None:
+        keep = keep & np.stack([~np.isin(ids, ex) for ids, ex in zip(token_ids, exclude)])
+
+    width = min(k, int(keep.sum(axis=1).max(initial=0)))
+    order = np.argsort(~keep, axis=1, kind="stable")[:, :width]
+    kept = np.take_along_axis(keep, order, axis=1)
+    token_ids = np.where(kept, np.take_along_axis(token_ids, order, axis=1), -1)
+    scores = np.where(kept, np.take_along_axis(scores, order, axis=1), -np.inf).astype(np.float32)
+    return token_ids, scores
+
+
+class ExactIndex:
+    """
+    Exact top-k cosine search over an EmbeddingStore.
+
+    Searches the store's normalized float16 rows, which build_store writes
+    next to the embeddings. They are memory-mapped like the embeddings, so
+    the index adds no resident copy of the matrix; each block is converted
+    to float32 for the matrix product.
+    """
+
+    def __init__(self, store: EmbeddingStore):
+        self.store = store
+
+    @timed()
+    def search_rows(self, queries, k: int = 10):
+        """Returns the (n, k) rows and cosine similarities closest to each query."""
+        queries = _normalize(queries)
+        k = min(k, len(self.store))
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        # One float32 buffer per search, reused for every block
+        buffer = np.empty((min(_SEARCH_BLOCK_ROWS, len(self.store)), self.store.dim), dtype=np.float32)
+
+        for start in range(0, len(self.store), _SEARCH_BLOCK_ROWS):
+            stored = self.store.normalized[start:start + _SEARCH_BLOCK_ROWS]
+            block = buffer[:len(stored)]
+            np.copyto(block, stored)
+            scores = queries @ block.T
+            rows, scores = top_k_indices(scores, k)
+
+            best_rows = np.concatenate([best_rows, rows + start], axis=1)
+            best_scores = np.concatenate([best_scores, scores], axis=1)
+            order, best_scores = top_k_indices(best_scores, k)
+            best_rows = np.take_along_axis(best_rows, order, axis=1)
+
+        return best_rows, best_scores
+
+    def search(self, queries, k: int = 10, exclude=None):
+        """
+        Returns the (n, k) token ids and cosine similarities closest to each
+        query vector, leaving out the token ids in exclude.
+        """
+        queries = np.atleast_2d(queries)
+        exclude, extra = _per_query(exclude, len(queries))
+        rows, scores = self.search_rows(queries, k + extra)
+        return _drop_excluded(rows, scores, self.store, exclude, k)
+
+
+class LSHIndex:
+    """
+    Approximate cosine search with random-hyperplane LSH.
+
+    Every table hashes a row to the sign pattern of n_bits random
+    projections. A query collects the rows sharing its bucket in any table
+    (and, with probe_neighbours, the buckets one bit away) and ranks only
+    those candidates exactly.
+
+    The index is built offline with build() and saved as a directory of
+    .npy files, which load() memory-maps.
+    """
+
+    def __init__(self, store: EmbeddingStore, hyperplanes, codes, order, inverse_norms):
+        self.store = store
+        self.hyperplanes = hyperplanes
+        self.codes = codes
+        self.order = order
+        self.inverse_norms = inverse_norms
+
+    @classmethod
+    def build(cls, store: EmbeddingStore, n_bits: int = 12, n_tables: int = 8, seed: int = 0):
+        rng = np.random.default_rng(seed)
+        hyperplanes = rng.standard_normal((n_tables, n_bits, store.dim)).astype(np.float32)
+        codes = np.empty((n_tables, len(store)), dtype=np.uint32)
+        for start in range(0, len(store), _BLOCK_ROWS):
+            block = np.asarray(store.matrix[start:start + _BLOCK_ROWS], dtype=np.float32)
+            codes[:, start:start + len(block)] = _hash(block, hyperplanes)
+
+        # Rows sorted by code per table, so each bucket is a contiguous range
+        order = np.argsort(codes, axis=1, kind="stable")
+        codes = np.take_along_axis(codes, order, axis=1)
+        return cls(store, hyperplanes, codes, order, _row_inverse_norms(store))
+
+    def save(self, path=LSH_INDEX_DIR):
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        np.save(path / "hyperplanes.npy", self.hyperplanes)
+        np.save(path / "codes.npy", self.codes)
+        np.save(path / "order.npy", self.order)
+        np.save(path / "inverse_norms.npy", self.inverse_norms)
+
+    @classmethod
+    def load(cls, store: EmbeddingStore, path=LSH_INDEX_DIR):
+        path = Path(path)
+        return cls(
+            store,
+            np.load(path / "hyperplanes.npy"),
+            np.load(path / "codes.npy", mmap_mode="r"),
+            np.load(path / "order.npy", mmap_mode="r"),
+            np.load(path / "inverse_norms.npy")
+        )
+
+    def candidates(self, query, probe_neighbours: bool = True):
+        """Returns the rows sharing a bucket with the query in any table."""
+        query_codes = _hash(query[None, :], self.hyperplanes)[:, 0]
+        n_bits = self.hyperplanes.shape[1]
+        found = []
+        for table, code in enumerate(query_codes.tolist()):
+            probes = [code]
+            if probe_neighbours:
+                probes += [code ^ (1 << b) for b in range(n_bits)]
+            lo = np.searchsorted(self.codes[table], probes, side="left")
+            hi = np.searchsorted(self.codes[table], probes, side="right")
+            found += [self.order[table, a:b] for a, b in zip(lo, hi) if b > a]
+        if not found:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(found))
+
+    def search(self, queries, k: int = 10, exclude=None, probe_neighbours: bool = True):
+        """Same interface as ExactIndex.search, ranking only LSH candidates."""
+        queries = _normalize(queries)
+        exclude, extra = _per_query(exclude, len(queries))
+        width = k + extra
+        # Queries with fewer candidates than width leave row -1 in the rest
+        rows = np.full((len(queries), width), -1, dtype=np.int64)
+        scores = np.full((len(queries), width), -np.inf, dtype=np.float32)
+
+        for i, query in enumerate(queries):
+            candidates = self.candidates(query, probe_neighbours)
+            if len(candidates) == 0:
+                continue
+            vectors = np.asarray(self.store.matrix[candidates], dtype=np.float32)
+            candidate_scores = (vectors @ query) * self.inverse_norms[candidates]
+            top, top_scores = top_k_indices(candidate_scores[None, :], width)
+            rows[i, :top.shape[1]] = candidates[top[0]]
+            scores[i, :top.shape[1]] = top_scores[0]
+
+        return _drop_excluded(rows, scores, self.store, exclude, k)
+
+
+def _hash(vectors, hyperplanes):
+    """(n_tables, n) bucket codes: the sign bits of the projections onto each table's hyperplanes."""
+    bits = np.einsum("tbd,nd->tnb", hyperplanes, vectors) > 0
+    weights = (1 << np.arange(hyperplanes.shape[1], dtype=np.uint32))
+    return (bits * weights).sum(axis=2, dtype=np.uint32)
+
+
+def analogy(index, a, b, c, k: int = 5):
+    """
+    Solves "a is to b as c is to ?" (e.g. man : king :: woman : queen) by
+    searching for b - a + c. Arguments are token ids; returns (token_ids, scores)
+    without the input tokens.
+    """
+    va, vb, vc = _normalize(index.store.get([a, b, c]))
+    token_ids, scores = index.search((vb - va + vc)[None, :], k, exclude=[a, b, c])
+    # An approximate index may find fewer than k tokens
+    found = token_ids[0] >= 0
+    return token_ids[0][found], scores[0][found]
+
+
+if __name__ == "__main__":
+    LSHIndex.build(EmbeddingStore()).save()
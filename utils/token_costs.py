@@ -0,0 +1,291 @@
+"""
+Token counts and cost estimates for large batches of prompts.
+
+Prompts are streamed from JSONL, CSV or plain text files, counted in
+batches on a process pool (one tiktoken encoder per encoding per worker)
+and aggregated as the batches come back. Only a bounded number of batches
+is in flight at a time and no per-prompt results are kept, so memory stays
+flat however large the input is. A text file is one prompt, read in chunks
+that are counted separately and added up.
+
+    python -m utils.token_costs prompts.jsonl more_prompts/ --out counts.csv
+"""
+import csv
+import json
+import multiprocessing
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+
+from utils.tokenization import iter_file_chunks
+from utils.tokenizers import get_encoding
+
+# Example input prices in USD per million tokens, and the encoding each
+# model uses. Check the provider's price list before relying on them.
+MODEL_PRICES = {
+    "gpt-4o": ("o200k_base", 2.50),
+    "gpt-4o-mini": ("o200k_base", 0.15),
+    "gpt-4-turbo": ("cl100k_base", 10.00),
+    "gpt-3.5-turbo": ("cl100k_base", 0.50),
+}
+
+# Fields tried, in order, for the prompt text of a JSON record or CSV row
+PROMPT_FIELDS = ["prompt", "text", "input", "content"]
+
+SUPPORTED_SUFFIXES = [".jsonl", ".csv", ".txt"]
+
+BATCH_SIZE = 256
+
+# Per-prompt token counts are binned by bit length: bin i holds counts in [2**(i-1), 2**i)
+HISTOGRAM_BINS = 32
+
+
+def _json_prompt(record) -> str:
+    if isinstance(record, str):
+        return record
+    if isinstance(record, dict):
+        for name in PROMPT_FIELDS:
+            if isinstance(record.get(name), str):
+                return record[name]
+        if isinstance(record.get("messages"), list):
+            # Chat format: count the text of every message
+            return "\n".join(m.get("content") or "" for m in record["messages"] if isinstance(m, dict))
+    return json.dumps(record)
+
+
+def iter_prompts(f, name: str):
+    """
+    Yields (prompt, bytes read, continued) for every prompt in the binary
+    file f. The format is picked by the file name's suffix: one record per
+    JSONL line, one per CSV row, or the whole file for anything else. A
+    whole file is yielded in chunks; continued is True for every chunk that
+    continues the previous one's prompt.
+    """
+    suffix = Path(name).suffix.lower()
+    if suffix == ".jsonl":
+        for line in f:
+            if line.strip():
+                yield _json_prompt(json.loads(line)), len(line), False
+            else:
+                yield None, len(line), False
+    elif suffix == ".csv":
+        consumed = [0]
+
+        def lines():
+            for line in f:
+                consumed[0] += len(line)
+                yield line.decode("utf-8", errors="replace")
+
+        reader = csv.reader(lines())
+        header = next(reader, [])
+        lowered = [h.strip().lower() for h in header]
+        column = next((lowered.index(n) for n in PROMPT_FIELDS if n in lowered), 0)
+        for row in reader:
+            size, consumed[0] = consumed[0], 0
+            yield (row[column] if column < len(row) else ""), size, False
+    else:
+        continued = False
+        for text, size in iter_file_chunks(f):
+            yield text, size, continued
+            continued = True
+        if not continued:
+            # An empty file is still one (empty) prompt
+            yield "", 0, False
+
+
+def iter_paths(paths):
+    """Expands directories into the supported files inside them, recursively."""
+    for path in map(Path, paths):
+        if path.is_dir():
+            yield from sorted(p for p in path.rglob("*") if p.suffix.lower() in SUPPORTED_SUFFIXES)
+        else:
+            yield path
+
+
+@dataclass
+class TokenCounts:
+    """Running totals over all counted prompts, per encoding."""
+    prompts: int = 0
+    characters: int = 0
+    tokens: dict = field(default_factory=dict)
+    max_tokens: dict = field(default_factory=dict)
+    histogram: dict = field(default_factory=dict)
+
+    def add(self, characters: int, counts: dict):
+        """Adds one batch, given its {encoding: per-prompt token counts}."""
+        self.prompts += len(next(iter(counts.values())))
+        self.characters += characters
+        for name, batch in counts.items():
+            self.tokens[name] = self.tokens.get(name, 0) + int(batch.sum())
+            self.max_tokens[name] = max(self.max_tokens.get(name, 0), int(batch.max(initial=0)))
+            bins = np.bincount(np.minimum(_bit_length(batch), HISTOGRAM_BINS - 1), minlength=HISTOGRAM_BINS)
+            self.histogram[name] = self.histogram.get(name, 0) + bins
+
+    def cost(self, model: str) -> float:
+        encoding, price = MODEL_PRICES[model]
+        return self.tokens.get(encoding, 0) * price / 1_000_000
+
+
+def _bit_length(counts):
+    return np.where(counts > 0, np.floor(np.log2(np.maximum(counts, 1))).astype(np.int64) + 1, 0)
+
+
+def _count_batch(prompts, encodings):
+    """Runs in a worker: the token count of every prompt, per encoding."""
+    counts = {}
+    for name in encodings:
+        enc = get_encoding(name)
+        # encode_ordinary skips the special-token checks; only the length is kept
+        counts[name] = np.fromiter((len(enc.encode_ordinary(p)) for p in prompts), dtype=np.int64, count=len(prompts))
+    return counts
+
+
+class TokenCounter:
+    """
+    Counts tokens of streamed prompts on a process pool.
+
+    The pool is started once and reused; pass workers=0 to count in the
+    calling process instead, which is faster for small inputs.
+    """
+
+    def __init__(self, workers: int = None, batch_size: int = BATCH_SIZE, mp_context: str = "spawn"):
+        self.batch_size = batch_size
+        self.workers = multiprocessing.cpu_count() if workers is None else workers
+        self._pool = None
+        if self.workers > 0:
+            # spawn, because forking a process that runs threads (like the
+            # Streamlit server) is unsafe
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context(mp_context))
+
+    def _batches(self, prompts):
+        """
+        Groups (prompt, size, continued) items into (prompts, continued,
+        characters, size) batches.
+        """
+        batch, continued, size = [], [], 0
+        for prompt, n_bytes, continues in prompts:
+            size += n_bytes
+            if prompt is not None:
+                batch.append(prompt)
+                continued.append(continues)
+            if len(batch) >= self.batch_size:
+                yield batch, np.array(continued, dtype=bool), sum(map(len, batch)), size
+                batch, continued, size = [], [], 0
+        if batch or size:
+            yield batch, np.array(continued, dtype=bool), sum(map(len, batch)), size
+
+    def count(self, prompts, encodings, on_progress=None, on_batch=None) -> TokenCounts:
+        """
+        Counts the tokens of every prompt in the iterable of (prompt, bytes
+        read, continued) items, as yielded by iter_prompts, for each encoding.
+
+        on_progress(bytes read) is called after each batch, and
+        on_batch(counts) with {encoding: per-prompt counts} of the prompts
+        completed by the batch.
+        """
+        encodings = list(encodings)
+        totals = TokenCounts()
+        read = 0
+        # Counts of the last prompt so far, which the next batch may continue
+        carry = None
+
+        def collect(counts, continued, characters, size):
+            nonlocal read, carry
+            read += size
+            if counts:
+                # Group 0 holds the items that continue the carried prompt
+                groups = np.cumsum(~continued)
+                complete, last = {}, {}
+                for name, batch in counts.items():
+                    per_prompt = np.bincount(groups, weights=batch, minlength=groups[-1] + 1).astype(np.int64)
+                    if carry is not None:
+                        per_prompt[0] += carry[name]
+                    else:
+                        per_prompt = per_prompt[1:]
+                    complete[name], last[name] = per_prompt[:-1], per_prompt[-1]
+                carry = last
+                totals.add(characters, complete)
+                if on_batch is not None and len(complete[encodings[0]]):
+                    on_batch(complete)
+            if on_progress is not None:
+                on_progress(read)
+
+        def finish():
+            if carry is not None:
+                last = {name: np.array([c]) for name, c in carry.items()}
+                totals.add(0, last)
+                if on_batch is not None:
+                    on_batch(last)
+            return totals
+
+        if self._pool is None:
+            for batch, continued, characters, size in self._batches(prompts):
+                collect(_count_batch(batch, encodings) if batch else {}, continued, characters, size)
+            return finish()
+
+        # At most two batches per worker are queued, which bounds memory
+        # use; results are collected in submission order.
+        pending = deque()
+        for batch, continued, characters, size in self._batches(prompts):
+            future = self._pool.submit(_count_batch, batch, encodings) if batch else None
+            pending.append((future, continued, characters, size))
+            if len(pending) >= 2 * self.workers:
+                future, continued, characters, size = pending.popleft()
+                collect(future.result() if future else {}, continued, characters, size)
+        while pending:
+            future, continued, characters, size = pending.popleft()
+            collect(future.result() if future else {}, continued, characters, size)
+        return finish()
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Count tokens and estimate costs of prompt files.")
+    parser.add_argument("paths", nargs="+", help="JSONL, CSV or text files, or directories of them")
+    parser.add_argument("--model", action="append", choices=list(MODEL_PRICES), help="models to price (default: all)")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--out", help="write the per-prompt token counts to this CSV file")
+    args = parser.parse_args()
+
+    models = args.model or list(MODEL_PRICES)
+    encodings = sorted({MODEL_PRICES[m][0] for m in models})
+    paths = list(iter_paths(args.paths))
+    total_bytes = sum(p.stat().st_size for p in paths)
+
+    def prompts():
+        for path in paths:
+            with open(path, "rb") as f:
+                yield from iter_prompts(f, path.name)
+
+    writer = None
+    if args.out:
+        out = open(args.out, "w", newline="")
+        writer = csv.writer(out)
+        writer.writerow(encodings)
+
+    def write_batch(counts):
+        writer.writerows(zip(*(counts[name].tolist() for name in encodings)))
+
+    def progress(read):
+        print(f"\r{read / max(total_bytes, 1):6.1%}", end="", file=sys.stderr)
+
+    counter = TokenCounter(args.workers)
+    totals = counter.count(prompts(), encodings, on_progress=progress, on_batch=write_batch if writer else None)
+    counter.shutdown()
+    print(file=sys.stderr)
+    if writer:
+        out.close()
+
+    print(f"{totals.prompts:,} prompts, {totals.characters:,} characters")
+    for model in models:
+        encoding = MODEL_PRICES[model][0]
+        print(f"{model:15s} {totals.tokens.get(encoding, 0):>15,} tokens  ${totals.cost(model):,.4f}")
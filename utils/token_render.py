@@ -0,0 +1,85 @@
+import html
+
+import numpy as np
+
+from utils.profiling import timed
+
+TOKEN_COLORS = [
+    "#ff6666", "#ff9966", "#ffcc66",
+    "#99cc66", "#66cccc", "#6699ff",
+    "#cc66ff"
+]
+
+# One class per color instead of an inline style on every span keeps the
+# payload per token small.
+TOKEN_CSS = "<style>\n" + "\n".join(
+    [
+        ".tok { padding:2px 4px; border-radius:4px; display:inline-block; margin:2px; }",
+        ".tok-box { border:1px solid #ddd; padding:10px; border-radius:6px; height:300px; "
+        "overflow-y:scroll; background:#fafafa; white-space: pre-wrap; }",
+    ]
+    + [f".tok-{i} {{ background:{c}22; }}" for i, c in enumerate(TOKEN_COLORS)]
+) + "\n</style>"
+
+
+def escape_token_text(s: str) -> str:
+    """Makes whitespace and backticks in a token visible inside markdown code."""
+    s = s.replace("\n", "\\n")
+    s = s.replace("\r", "\\r")
+    s = s.replace("`", "\\`")
+    return s
+
+
+class DecodeTable:
+    """
+    Decoded, escaped text of every token id of an encoding, computed once so
+    rendering a token is an array lookup instead of an enc.decode call.
+
+    text holds the markdown-ready piece, html the same piece HTML-escaped.
+    Ids without a token (gaps before the special tokens) map to "".
+    """
+
+    @timed("DecodeTable.build")
+    def __init__(self, enc):
+        text = []
+        for t in range(enc.n_vocab):
+            try:
+                piece = enc.decode_single_token_bytes(t).decode("utf-8", errors="replace")
+            except KeyError:
+                piece = ""
+            text.append(escape_token_text(piece))
+
+        self.text = np.array(text, dtype=object)
+        self.html = np.array(
+            [html.escape(s).replace(" ", "&nbsp;") for s in text],
+            dtype=object
+        )
+
+
+def page_bounds(n_tokens: int, page: int, page_size: int):
+    """Returns the (start, stop) token range of a 1-based page."""
+    start = (page - 1) * page_size
+    return start, min(start + page_size, n_tokens)
+
+
+@timed()
+def render_tokens_html(tokens, table: DecodeTable) -> str:
+    """Renders a slice of token ids as colored spans inside a scroll box."""
+    tokens = np.asarray(tokens, dtype=np.int64)
+    pieces = table.html[tokens]
+    classes = tokens % len(TOKEN_COLORS)
+    spans = "".join(
+        f"<span class='tok tok-{c}' title='{t}'>{p}</span>"
+        for t, c, p in zip(tokens.tolist(), classes.tolist(), pieces)
+    )
+    return f"<div class='tok-box'>{spans}</div>"
+
+
+@timed()
+def render_token_ids_markdown(tokens, table: DecodeTable) -> str:
+    """Renders a slice of token ids as a `piece` → **id** list."""
+    tokens = np.asarray(tokens, dtype=np.int64)
+    return "<br>".join(
+        f"`{p}` → **{t}**"
+        for t, p in zip(tokens.tolist(), table.text[tokens])
+    )
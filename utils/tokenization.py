@@ -0,0 +1,231 @@
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+
+from utils.profiling import timed
+from utils.tokenizers import get_encoding
+
+# A single newline between two non-whitespace characters is a
+# pre-tokenization boundary for all tiktoken encodings, so chunks split there
+# encode to exactly the same tokens as the whole text. The character after it
+# must not be "/", which o200k attaches to punctuation before the newline
+# ("'\n/" is one piece).
+_SAFE_BOUNDARY = re.compile(r"(?<=\S)\n(?=[^\s/])")
+
+# The same boundary in UTF-8 bytes, with printable ASCII characters around
+# the newline, so it can be found without decoding
+SAFE_BYTE_BOUNDARY = re.compile(rb"(?<=[!-~])\n(?=[!-.0-~])")
+
+
+def split_into_chunks(text: str, chunk_size: int = 65536):
+    """
+    Splits text into chunks of roughly chunk_size characters, cutting only at
+    safe tokenization boundaries. Text without such a boundary stays one chunk.
+    """
+    chunks = []
+    start = 0
+    while len(text) - start > chunk_size:
+        match = _SAFE_BOUNDARY.search(text, start + chunk_size)
+        if match is None:
+            break
+        chunks.append(text[start:match.end()])
+        start = match.end()
+    chunks.append(text[start:])
+    return chunks
+
+
+def fallback_cut(data, start: int, end: int) -> int:
+    """
+    Where to cut data[start:end] (bytes) when it has no safe boundary: before
+    its last whitespace byte, or else at end, moved back to the start of a
+    UTF-8 character. The tokens on either side of such a cut can differ a
+    little from the whole text's, so this is only for text without newlines.
+    """
+    cut = max(data.rfind(c, start + 1, end) for c in (b" ", b"\t", b"\n", b"\r"))
+    if cut > start:
+        return cut
+    cut = end
+    while start + 1 < cut < len(data) and data[cut] & 0xC0 == 0x80:
+        cut -= 1
+    return cut
+
+
+def iter_file_chunks(f, chunk_bytes: int = 1 << 20, max_bytes: int = None):
+    """
+    Yields (text, bytes read) chunks of the binary file f, each about
+    chunk_bytes long and cut at safe boundaries, so the token counts of the
+    chunks add up to the token count of the whole file.
+
+    A chunk without a safe boundary is cut with fallback_cut once it reaches
+    max_bytes (4 * chunk_bytes by default), so a file without newlines is
+    never read into memory whole.
+    """
+    max_bytes = 4 * chunk_bytes if max_bytes is None else max_bytes
+    buffer = bytearray()
+    for block in iter(lambda: f.read(chunk_bytes), b""):
+        buffer += block
+        match = SAFE_BYTE_BOUNDARY.search(buffer, len(buffer) - len(block))
+        if match:
+            cut = match.end()
+        elif len(buffer) >= max_bytes:
+            cut = fallback_cut(buffer, 0, len(buffer))
+        else:
+            continue
+        yield buffer[:cut].decode("utf-8", errors="replace"), cut
+        del buffer[:cut]
+    if buffer:
+        yield buffer.decode("utf-8", errors="replace"), len(buffer)
+
+
+@dataclass
+class TokenizationResult:
+    tokens: np.ndarray
+    seconds: float
+    chunks: int
+    cached_chunks: int
+
+    @property
+    def tokens_per_second(self) -> float:
+        return len(self.tokens) / self.seconds if self.seconds > 0 else float("inf")
+
+
+class ChunkedTokenizer:
+    """
+    Encodes large texts chunk by chunk, in parallel, caching the tokens of
+    each chunk by a hash of its content. Editing the end of a long document
+    only re-encodes the chunk that changed.
+
+    The cache is guarded by a lock, so one instance can be shared across
+    sessions (e.g. through st.cache_resource).
+    """
+
+    def __init__(self, enc, chunk_size: int = 65536, max_cached_chunks: int = 1024, num_threads: int = 8):
+        self.enc = enc
+        self.chunk_size = chunk_size
+        self.max_cached_chunks = max_cached_chunks
+        self.num_threads = num_threads
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _key(self, chunk: str):
+        return hashlib.blake2b(chunk.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+
+    @timed()
+    def encode(self, text: str) -> TokenizationResult:
+        start = time.perf_counter()
+        chunks = split_into_chunks(text, self.chunk_size)
+        keys = [self._key(c) for c in chunks]
+
+        with self._lock:
+            found = {k: self._cache[k] for k in keys if k in self._cache}
+            for k in found:
+                self._cache.move_to_end(k)
+
+        cached_chunks = sum(k in found for k in keys)
+        missing = {k: c for k, c in zip(keys, chunks) if k not in found}
+        if missing:
+            encoded = self.enc.encode_batch(
+                list(missing.values()),
+                num_threads=self.num_threads,
+                disallowed_special=()
+            )
+            new = {k: np.asarray(t, dtype=np.uint32) for k, t in zip(missing, encoded)}
+            found.update(new)
+            with self._lock:
+                self._cache.update(new)
+                while len(self._cache) > self.max_cached_chunks:
+                    self._cache.popitem(last=False)
+
+        tokens = np.concatenate([found[k] for k in keys])
+        return TokenizationResult(
+            tokens=tokens,
+            seconds=time.perf_counter() - start,
+            chunks=len(chunks),
+            cached_chunks=cached_chunks
+        )
+
+
+COMPARISON_ENCODINGS = ["o200k_base", "cl100k_base", "p50k_base", "r50k_base"]
+
+# Shared by all sessions. tiktoken releases the GIL while encoding, so the
+# encodings of one comparison run in parallel.
+_comparison_pool = ThreadPoolExecutor(max_workers=len(COMPARISON_ENCODINGS), thread_name_prefix="compare")
+
+_byte_lengths = {}
+_byte_lengths_lock = threading.Lock()
+
+
+def token_byte_lengths(enc) -> np.ndarray:
+    """Length in bytes of every token id of enc (0 for ids without a token), computed once per encoding."""
+    lengths = _byte_lengths.get(enc.name)
+    if lengths is not None:
+        return lengths
+
+    lengths = np.zeros(enc.n_vocab, dtype=np.int64)
+    for t in range(enc.n_vocab):
+        try:
+            lengths[t] = len(enc.decode_single_token_bytes(t))
+        except KeyError:
+            pass
+    with _byte_lengths_lock:
+        return _byte_lengths.setdefault(enc.name, lengths)
+
+
+@dataclass
+class EncodingComparison:
+    name: str
+    tokens: np.ndarray
+    # Byte offset in the UTF-8 text where each token ends
+    boundaries: np.ndarray
+    seconds: float
+    chars_per_token: float
+    # Fraction of the token boundaries that are also boundaries in the first encoding
+    shared_boundaries: float
+
+
+def _encode_timed(name: str, text: str):
+    enc = get_encoding(name)
+    start = time.perf_counter()
+    tokens = np.asarray(enc.encode(text, disallowed_special=()), dtype=np.uint32)
+    seconds = time.perf_counter() - start
+    return tokens, seconds, np.cumsum(token_byte_lengths(enc)[tokens])
+
+
+@timed()
+def compare_encodings(text: str, names=COMPARISON_ENCODINGS):
+    """
+    Encodes text with every encoding in names at once on the shared pool.
+    Encodings are loaded on first use and stay loaded in the registry.
+
+    Token boundaries are compared as byte offsets, which all encodings of
+    the same text share, so the comparison needs no per-token loop.
+    """
+    futures = [_comparison_pool.submit(_encode_timed, name, text) for name in names]
+    results = [f.result() for f in futures]
+
+    reference = results[0][2]
+    return [
+        EncodingComparison(
+            name=name,
+            tokens=tokens,
+            boundaries=boundaries,
+            seconds=seconds,
+            chars_per_token=len(text) / len(tokens) if len(tokens) else 0.0,
+            shared_boundaries=float(np.isin(boundaries, reference, assume_unique=True).mean()) if len(tokens) else 1.0
+        )
+        for name, (tokens, seconds, boundaries) in zip(names, results)
+    ]
+
+
+def common_boundaries(comparisons) -> np.ndarray:
+    """Byte offsets where every compared encoding has a token boundary."""
+    common = comparisons[0].boundaries
+    for c in comparisons[1:]:
+        common = np.intersect1d(common, c.boundaries, assume_unique=True)
+    return common
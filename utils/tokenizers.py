@@ -0,0 +1,126 @@
+"""
+Process-wide registry of tiktoken encodings, loaded from a local cache.
+
+tiktoken downloads the BPE rank files on first use. The registry points
+tiktoken's file cache at assets/tiktoken/ (unless TIKTOKEN_CACHE_DIR is
+already set), so a deployment without outbound network can ship the files
+with the app. Populate the directory once where network is available:
+
+    python -m utils.tokenizers o200k_base cl100k_base p50k_base r50k_base
+"""
+import logging
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+import tiktoken
+
+TOKENIZER_CACHE_DIR = Path(__file__).resolve().parent.parent / "assets" / "tiktoken"
+os.environ.setdefault("TIKTOKEN_CACHE_DIR", str(TOKENIZER_CACHE_DIR))
+
+DEFAULT_ENCODINGS = ["o200k_base"]
+
+# Loading one encoding from the local cache should stay well below this.
+LOAD_BUDGET_SECONDS = 1.0
+# A failed load is retried after this long, so files added to the cache
+# directory are picked up without restarting the app.
+RETRY_SECONDS = 30.0
+
+logger = logging.getLogger(__name__)
+
+
+class TokenizerUnavailableError(RuntimeError):
+    """The BPE file of an encoding is neither in the local cache nor downloadable."""
+
+
+_encodings = {}
+_load_seconds = {}
+_errors = {}
+_lock = threading.Lock()
+
+
+def get_encoding(name: str) -> tiktoken.Encoding:
+    """
+    Returns the encoding with the given name, loading it on first use.
+    Raises TokenizerUnavailableError if it can't be loaded; the failure is
+    remembered for RETRY_SECONDS, so later calls don't try to download the
+    file again on every rerun.
+    """
+    enc = _encodings.get(name)
+    if enc is not None:
+        return enc
+
+    with _lock:
+        if name in _errors:
+            error, failed_at = _errors[name]
+            if time.monotonic() - failed_at < RETRY_SECONDS:
+                raise error
+            del _errors[name]
+        if name not in _encodings:
+            start = time.perf_counter()
+            try:
+                enc = tiktoken.get_encoding(name)
+            except Exception as e:
+                error = TokenizerUnavailableError(
+                    f"The tokenizer file for '{name}' is missing from {os.environ['TIKTOKEN_CACHE_DIR']} "
+                    f"and could not be downloaded. Run `python -m utils.tokenizers {name}` "
+                    "where network is available and ship the directory with the app."
+                )
+                error.__cause__ = e
+                _errors[name] = (error, time.monotonic())
+                raise error
+            seconds = time.perf_counter() - start
+            if seconds > LOAD_BUDGET_SECONDS:
+                logger.warning("Loading encoding %s took %.2fs (budget %.2fs)", name, seconds, LOAD_BUDGET_SECONDS)
+            _encodings[name] = enc
+            _load_seconds[name] = seconds
+        return _encodings[name]
+
+
+def encoding_for_model(model: str) -> tiktoken.Encoding:
+    return get_encoding(tiktoken.encoding_name_for_model(model))
+
+
+def require_encoding(name: str) -> tiktoken.Encoding:
+    """
+    get_encoding() for pages: if the encoding can't be loaded, shows the
+    error on the page and stops the script.
+    """
+    try:
+        return get_encoding(name)
+    except TokenizerUnavailableError as e:
+        import streamlit as st
+        st.error(str(e))
+        st.stop()
+
+
+def require_encoding_for_model(model: str) -> tiktoken.Encoding:
+    return require_encoding(tiktoken.encoding_name_for_model(model))
+
+
+def load_seconds(name: str):
+    """Returns how long the encoding took to load, or None if it isn't loaded."""
+    return _load_seconds.get(name)
+
+
+def warm_up(names=DEFAULT_ENCODINGS):
+    """
+    Loads the given encodings ahead of time and returns {name: seconds}.
+    Encodings that can't be loaded are logged and skipped.
+    """
+    timings = {}
+    for name in names:
+        try:
+            get_encoding(name)
+        except TokenizerUnavailableError as e:
+            logger.error("%s", e)
+            continue
+        timings[name] = _load_seconds[name]
+    return timings
+
+
+if __name__ == "__main__":
+    for name, seconds in warm_up(sys.argv[1:] or DEFAULT_ENCODINGS).items():
+        print(f"{name}: loaded in {seconds * 1000:.0f} ms")
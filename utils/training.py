@@ -0,0 +1,183 @@
+import time
+from pathlib import Path
+
+import numpy as np
+
+from utils.generation import CORPUS_PATH
+from utils.profiling import timed
+
+TRAINING_DIR = Path(__file__).resolve().parent.parent / "assets" / "training"
+
+_BLOCK_TOKENS = 1 << 20
+
+
+def build_token_file(enc, text_path=CORPUS_PATH, path=None) -> Path:
+    """
+    Tokenizes the text file once and saves the token ids as a uint32 .npy
+    file, which load_tokens() memory-maps. Returns the file's path.
+
+    The default file name includes the text file's size and modification
+    time, so an edited corpus is tokenized again; files of older versions
+    are removed.
+    """
+    if path is None:
+        text_stat = Path(text_path).stat()
+        prefix = f"{Path(text_path).stem}.{enc.name}"
+        path = TRAINING_DIR / f"{prefix}.{text_stat.st_size}-{text_stat.st_mtime_ns}.npy"
+        for stale in TRAINING_DIR.glob(f"{prefix}.*-*.npy"):
+            # Partial files belong to a build that is still running
+            if stale != path and not stale.name.endswith(".partial.npy"):
+                stale.unlink(missing_ok=True)
+    path = Path(path)
+    if not path.exists():
+        with open(text_path, "r") as f:
+            tokens = np.asarray(enc.encode(f.read(), disallowed_special=()), dtype=np.uint32)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Written to a temporary file first, so a reader never sees a partial file
+        partial = path.with_suffix(".partial.npy")
+        np.save(partial, tokens)
+        partial.replace(path)
+    return path
+
+
+def load_tokens(path) -> np.ndarray:
+    return np.load(path, mmap_mode="r")
+
+
+def corpus_vocabulary(tokens: np.ndarray) -> np.ndarray:
+    """The sorted token ids that occur in tokens, counted block by block."""
+    seen = np.zeros(0, dtype=bool)
+    for start in range(0, len(tokens), _BLOCK_TOKENS):
+        block = np.asarray(tokens[start:start + _BLOCK_TOKENS])
+        if len(block) and block.max() >= len(seen):
+            seen = np.pad(seen, (0, int(block.max()) + 1 - len(seen)))
+        seen[block] = True
+    return np.flatnonzero(seen)
+
+
+class BigramTrainer:
+    """
+    A bigram language model (softmax regression from the previous token to
+    the next one) trained with Adam on minibatches streamed from a
+    memory-mapped token file.
+
+    The model only covers the tokens that occur in the corpus, so its
+    weight matrix is (corpus vocabulary, corpus vocabulary) instead of the
+    tokenizer's full vocabulary squared. Minibatches are consecutive
+    windows of the corpus, wrapping around at the end.
+
+    All training state lives on the instance, so training can be advanced
+    in short chunks (e.g. one per rerun) and continue where it stopped.
+    """
+
+    def __init__(self, tokens: np.ndarray, batch_size: int = 4096, learning_rate: float = 0.05,
+                 beta1: float = 0.9, beta2: float = 0.999, eps: float = 1e-8):
+        self.tokens = tokens
+        self.vocab = corpus_vocabulary(tokens)
+        self.compact = np.zeros(int(self.vocab[-1]) + 1 if len(self.vocab) else 0, dtype=np.int64)
+        self.compact[self.vocab] = np.arange(len(self.vocab))
+
+        self.batch_size = batch_size
+        self.learning_rate = learning_rate
+        self.beta1, self.beta2, self.eps = beta1, beta2, eps
+
+        n = len(self.vocab)
+        self.weights = np.zeros((n, n), dtype=np.float32)
+        self.m = np.zeros_like(self.weights)
+        self.v = np.zeros_like(self.weights)
+        # Adam step count of each row, for the bias correction of rows
+        # that are only updated when their token is in the batch
+        self.row_steps = np.zeros(n, dtype=np.int64)
+
+        self.position = 0
+        self.steps = 0
+        self.tokens_seen = 0
+        self.seconds = 0.0
+        self.history = []
+
+    @property
+    def vocab_size(self) -> int:
+        return len(self.vocab)
+
+    @property
+    def tokens_per_second(self) -> float:
+        return self.tokens_seen / self.seconds if self.seconds > 0 else 0.0
+
+    def _batch(self):
+        """Next (previous tokens, next tokens) window, as compact ids."""
+        pairs = len(self.tokens) - 1
+        start, stop = self.position, self.position + self.batch_size
+        self.position = stop % pairs
+        if stop <= pairs:
+            window = self.compact[self.tokens[start:stop + 1]]
+            return window[:-1], window[1:]
+        index = np.arange(start, stop) % pairs
+        return self.compact[self.tokens[index]], self.compact[self.tokens[index + 1]]
+
+    def step(self) -> float:
+        """One Adam step on the next minibatch. Returns its mean cross-entropy loss."""
+        previous, following = self._batch()
+        n = self.vocab_size
+
+        # All positions with the same previous token share one softmax row,
+        # so the batch is reduced to bigram counts first and the softmax is
+        # computed once per distinct previous token instead of per position.
+        pairs, pair_counts = np.unique(previous * n + following, return_counts=True)
+        touched, pair_rows = np.unique(pairs // n, return_inverse=True)
+        pair_columns = pairs % n
+        row_counts = np.bincount(pair_rows, weights=pair_counts, minlength=len(touched))
+
+        logits = self.weights[touched]
+        logits -= logits.max(axis=1, keepdims=True)
+        target = logits[pair_rows, pair_columns]
+        np.exp(logits, out=logits)
+        sums = logits.sum(axis=1)
+        loss = float((row_counts @ np.log(sums) - pair_counts @ target) / len(previous))
+
+        # Gradient w.r.t. each row: count * softmax - next-token counts
+        grad = logits
+        grad *= (row_counts / sums)[:, None]
+        grad[pair_rows, pair_columns] -= pair_counts
+        grad /= len(previous)
+
+        # Lazy Adam: only the rows seen in this batch are updated
+        self.row_steps[touched] += 1
+        t = self.row_steps[touched][:, None]
+        m = self.m[touched] * self.beta1 + (1 - self.beta1) * grad
+        v = self.v[touched] * self.beta2 + (1 - self.beta2) * grad * grad
+        self.m[touched], self.v[touched] = m, v
+        m_hat = m / (1 - self.beta1 ** t)
+        v_hat = v / (1 - self.beta2 ** t)
+        self.weights[touched] -= self.learning_rate * m_hat / (np.sqrt(v_hat) + self.eps)
+
+        self.steps += 1
+        self.tokens_seen += len(previous)
+        return loss
+
+    @timed("BigramTrainer.train")
+    def train(self, seconds: float = 0.5, max_tokens: int = None):
+        """
+        Trains for about the given number of seconds, or until max_tokens
+        have been seen in total. The chunk's mean loss is appended to history
+        as (tokens seen, loss).
+        """
+        start = time.perf_counter()
+        losses = []
+        while time.perf_counter() - start < seconds:
+            if max_tokens is not None and self.tokens_seen >= max_tokens:
+                break
+            losses.append(self.step())
+        self.seconds += time.perf_counter() - start
+        if losses:
+            self.history.append((self.tokens_seen, float(np.mean(losses))))
+        return len(losses)
+
+    def predict(self, token_id: int, k: int = 5):
+        """The k most likely next token ids after token_id, with their probabilities."""
+        if token_id >= len(self.compact) or self.vocab[self.compact[token_id]] != token_id:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        logits = self.weights[self.compact[token_id]].astype(np.float64)
+        probs = np.exp(logits - logits.max())
+        probs /= probs.sum()
+        top = np.argsort(-probs, kind="stable")[:k]
+        return self.vocab[top], probs[top]